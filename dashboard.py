@@ -58,7 +58,13 @@ def load_holidays_from_file(year):
 
 st.set_page_config(page_title="FAA PayTracker", layout="wide")
 st.markdown(views.get_css(), unsafe_allow_html=True)
-models.setup_database()
+
+@st.cache_resource
+def init_database():
+    # Schema check once per server process, not on every rerun
+    models.setup_database()
+
+init_database()
 
 tab_audit, tab_graphs, tab_facts, tab_ingest = st.tabs(["🧐 Audit & Time", "📊 Statistics & Graphs", "ℹ️ Basic Facts", "📥 Ingestion"])
 
@@ -311,7 +317,7 @@ with tab_audit:
 
         # 3. V2 Editor
         with st.expander("📝 Edit Schedule (Actual Worked)", expanded=True):
-            ts_v2 = models.load_timesheet_v2(pe)
+            has_saved, ts_v2 = models.load_timesheet_v2(pe)
 
             # --- HELPER FUNCTIONS ---
             def float_to_hhmm(val):
@@ -334,15 +340,15 @@ with tab_audit:
 
             # 1. SETUP: Fetch Schedule & Holidays Correctly FIRST
             pe_year = datetime.strptime(pe, "%Y-%m-%d").year
-            std_sched = models.get_user_schedule(pe_year).set_index('day_of_week')
+            std_sched = logic.schedule_to_dict(models.get_user_schedule(pe_year).set_index('day_of_week'))
             
             # Load Holidays using the new JSON loader
             all_holidays = logic.load_holidays()
-            # Flatten to simple list of strings ['2024-01-01', '2025-01-01', ...]
+            # Flatten to simple list of dates [date(2024, 1, 1), date(2025, 1, 1), ...]
             flat_holidays = [h for sublist in all_holidays.values() for h in sublist]
 
             # 2. RESTORED: Auto-Run Logic (Updated for Year-Aware Schedule)
-            if st.session_state.get('res') is None and models.has_saved_timesheet(pe):
+            if st.session_state.get('res') is None and has_saved:
                 # A. Convert strings to floats for math
                 temp_df = ts_v2.copy()
                 temp_df['OJTI'] = temp_df['OJTI'].apply(hhmm_to_float)
@@ -354,8 +360,8 @@ with tab_audit:
                 # C. Run Bucket Logic (Using the std_sched we fetched at the TOP)
                 bucket_rows = []
                 for _, row in temp_df.iterrows():
-                    s_obj = pd.to_datetime(row['Start'], format='%H:%M').time() if row['Start'] else None
-                    e_obj = pd.to_datetime(row['End'], format='%H:%M').time() if row['End'] else None
+                    s_obj = logic.parse_hhmm(row['Start'])
+                    e_obj = logic.parse_hhmm(row['End'])
                     
                     b = logic.calculate_daily_breakdown(
                         row['Date'], s_obj, e_obj, row['Leave_Type'], 
@@ -394,8 +400,7 @@ with tab_audit:
                 
                 # Check Holiday Logic
                 is_obs = False
-                for h in flat_holidays:
-                    h_d = datetime.strptime(h, "%Y-%m-%d").date()
+                for h_d in flat_holidays:
                     if logic.get_observed_holiday(h_d, std_sched) == d_obj:
                         is_obs = True
                         break
@@ -440,8 +445,8 @@ with tab_audit:
                 
                 bucket_rows = []
                 for _, row in calc_df.iterrows():
-                    s_obj = pd.to_datetime(row['Start'], format='%H:%M').time() if row['Start'] else None
-                    e_obj = pd.to_datetime(row['End'], format='%H:%M').time() if row['End'] else None
+                    s_obj = logic.parse_hhmm(row['Start'])
+                    e_obj = logic.parse_hhmm(row['End'])
                     
                     # Ensure 'b' is defined here as well
                     b = logic.calculate_daily_breakdown(
@@ -76,6 +76,12 @@ def setup_database():
         UNIQUE(period_ending, day_date)
     )''')
 
+    # 6. Indexes for the dashboard's per-stub lookups
+    c.execute("CREATE INDEX IF NOT EXISTS idx_earn_pid ON earnings(paystub_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_ded_pid ON deductions(paystub_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_leave_pid ON leave_balances(paystub_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_earn_regular ON earnings(id) WHERE type LIKE '%Regular%' AND rate > 0")
+
     conn.commit()
     return conn
 
@@ -134,55 +140,59 @@ def parse_html_paystub(html_content, filename, conn):
         print(f"Error parsing meta data in {filename}: {e}")
         return
 
+    # Line items are collected per table and written with one executemany each
     # Earnings
     earnings_table = soup.find("table", {"id": "Earnings"})
     if earnings_table:
+        earnings = []
         for row in earnings_table.find_all("tr")[1:]:
             cols = row.find_all("td")
             if len(cols) >= 6:
-                c.execute('''INSERT INTO earnings (paystub_id, type, rate, amount_adjusted, hours_adjusted, hours_current, amount_current, amount_ytd)
-                             VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
-                          (paystub_id,
-                           cols[0].get_text().strip(),
-                           clean_float(cols[1].get_text()),
-                           clean_float(cols[2].get_text()),
-                           clean_float(cols[3].get_text()),
-                           clean_float(cols[4].get_text()),
-                           clean_float(cols[5].get_text()),
-                           clean_float(cols[6].get_text())
-                          ))
+                earnings.append((paystub_id,
+                                 cols[0].get_text().strip(),
+                                 clean_float(cols[1].get_text()),
+                                 clean_float(cols[2].get_text()),
+                                 clean_float(cols[3].get_text()),
+                                 clean_float(cols[4].get_text()),
+                                 clean_float(cols[5].get_text()),
+                                 clean_float(cols[6].get_text())
+                                ))
+        c.executemany('''INSERT INTO earnings (paystub_id, type, rate, amount_adjusted, hours_adjusted, hours_current, amount_current, amount_ytd)
+                         VALUES (?, ?, ?, ?, ?, ?, ?, ?)''', earnings)
 
     # Deductions
+    deductions = []
     for table_id in ["Deduction0", "Deduction1"]:
         ded_table = soup.find("table", {"id": table_id})
         if ded_table:
             for row in ded_table.find_all("tr")[1:]:
                 cols = row.find_all("td")
                 if len(cols) >= 5:
-                    c.execute('''INSERT INTO deductions (paystub_id, type, amount_adjusted, amount_current, amount_ytd)
-                                 VALUES (?, ?, ?, ?, ?)''',
-                              (paystub_id,
-                               cols[0].get_text().strip(),
-                               clean_float(cols[2].get_text()),
-                               clean_float(cols[3].get_text()),
-                               clean_float(cols[4].get_text())
-                              ))
+                    deductions.append((paystub_id,
+                                       cols[0].get_text().strip(),
+                                       clean_float(cols[2].get_text()),
+                                       clean_float(cols[3].get_text()),
+                                       clean_float(cols[4].get_text())
+                                      ))
+    c.executemany('''INSERT INTO deductions (paystub_id, type, amount_adjusted, amount_current, amount_ytd)
+                     VALUES (?, ?, ?, ?, ?)''', deductions)
 
     # Leave
     leave_table = soup.find("table", {"id": "Leave"})
     if leave_table:
+        leave = []
         for row in leave_table.find_all("tr")[1:]:
             cols = row.find_all("td")
             if len(cols) >= 9:
-                c.execute('''INSERT INTO leave_balances (paystub_id, type, balance_start, earned_current, used_current, balance_end)
-                             VALUES (?, ?, ?, ?, ?, ?)''',
-                          (paystub_id,
-                           cols[0].get_text().strip(),
-                           clean_float(cols[1].get_text()),
-                           clean_float(cols[3].get_text()),
-                           clean_float(cols[5].get_text()),
-                           clean_float(cols[8].get_text())
-                          ))
+                leave.append((paystub_id,
+                              cols[0].get_text().strip(),
+                              clean_float(cols[1].get_text()),
+                              clean_float(cols[3].get_text()),
+                              clean_float(cols[5].get_text()),
+                              clean_float(cols[8].get_text())
+                             ))
+        c.executemany('''INSERT INTO leave_balances (paystub_id, type, balance_start, earned_current, used_current, balance_end)
+                         VALUES (?, ?, ?, ?, ?, ?)''', leave)
 
     conn.commit()
 
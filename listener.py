@@ -1,5 +1,10 @@
 import uvicorn
-from fastapi import FastAPI, HTTPException
+import gzip
+import json
+import hashlib
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.routing import APIRoute
 from pydantic import BaseModel
 from typing import Optional, List
 import sqlite3
@@ -15,7 +20,28 @@ PORT = 5000
 # REFERENCE DATE: A known Pay Period End date (e.g., Dec 14, 2024)
 REF_DATE = datetime.strptime("2024-12-14", "%Y-%m-%d")
 
+class GzipRequest(Request):
+    """Request whose body is transparently un-gzipped (the mobile app compresses its sync upload)."""
+    async def body(self) -> bytes:
+        if not hasattr(self, "_body"):
+            body = await super().body()
+            if "gzip" in self.headers.getlist("Content-Encoding"):
+                body = gzip.decompress(body)
+            self._body = body
+        return self._body
+
+class GzipRoute(APIRoute):
+    def get_route_handler(self):
+        original_handler = super().get_route_handler()
+
+        async def handler(request: Request):
+            return await original_handler(GzipRequest(request.scope, request.receive))
+        return handler
+
 app = FastAPI()
+app.router.route_class = GzipRoute
+# Compress the larger JSON replies (saved shifts / bootstrap) for the phone
+app.add_middleware(GZipMiddleware, minimum_size=1000)
 
 class ShiftEntry(BaseModel):
     day_date: str
@@ -172,7 +198,7 @@ async def get_holidays(year: Optional[int] = None):
 
     # 2. Load Raw Holidays
     all_holidays = logic.load_holidays()
-    raw_dates = all_holidays.get(str(target_year), [])
+    holiday_dates = all_holidays.get(target_year, [])
     
     # Hardcoded names to match your dashboard (ensure length matches json)
     holiday_names = [
@@ -183,9 +209,7 @@ async def get_holidays(year: Optional[int] = None):
 
     results = []
     # Zip safely (in case json length differs)
-    for name, date_str in zip(holiday_names, raw_dates):
-        actual_date = datetime.strptime(date_str, "%Y-%m-%d").date()
-        
+    for name, actual_date in zip(holiday_names, holiday_dates):
         # 3. Apply the Slide Rule
         observed_date = logic.get_observed_holiday(actual_date, calc_sched)
         
@@ -198,6 +222,27 @@ async def get_holidays(year: Optional[int] = None):
         
     return results
 
+@app.get("/mobile_bootstrap")
+async def mobile_bootstrap(request: Request, year: Optional[int] = None):
+    """
+    Everything the mobile 'Download schedule' button needs in one round trip:
+    schedule defaults, saved shifts for the year, and holidays for the year and the next.
+    Carries an ETag (hash of the body); a matching If-None-Match gets a bodyless 304.
+    """
+    target_year = year if year else datetime.now().year
+
+    payload = {
+        "schedule": await get_schedule_defaults(),
+        "shifts": await get_saved_shifts(target_year),
+        "holidays": await get_holidays(target_year) + await get_holidays(target_year + 1),
+    }
+    body = json.dumps(payload).encode()
+    etag = f'"{hashlib.sha1(body).hexdigest()}"'
+
+    if request.headers.get("If-None-Match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    return Response(content=body, media_type="application/json", headers={"ETag": etag})
+
 if __name__ == "__main__":
     print(f"🚀 Listener active at http://{HOST}:{PORT}")
     uvicorn.run(app, host=HOST, port=PORT)
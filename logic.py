@@ -1,47 +1,77 @@
 import pandas as pd
+import numpy as np
 import models
 import math
 import json
 import os
+import functools
 from datetime import datetime, timedelta
 
+@functools.lru_cache(maxsize=1)
 def load_holidays():
-    """Loads holidays from holidays.json located in the same directory."""
+    """
+    Loads holidays from holidays.json located in the same directory (read once per process).
+    Returns {year: [date, ...]} with the date strings already parsed.
+    """
     script_dir = os.path.dirname(os.path.abspath(__file__))
     json_path = os.path.join(script_dir, "holidays.json")
     
     if os.path.exists(json_path):
         with open(json_path, 'r') as f:
-            return json.load(f)
+            raw = json.load(f)
+        return {int(y): [datetime.strptime(h, "%Y-%m-%d").date() for h in lst] for y, lst in raw.items()}
     return {}
 
+def parse_hhmm(val):
+    """Parses an 'HH:MM' timesheet cell into a time; blank/None/'None' gives None."""
+    if not val or val == "None":
+        return None
+    return datetime.strptime(val, "%H:%M").time()
+
 # --- 1. Create a ledger to track missed government payments ---
 def generate_shutdown_ledger(stubs_meta, ref_rate, ref_ded, ref_earn, std_sched_ignored):
-    ledger = []
     running_balance = 0.0
     
     sorted_stubs = stubs_meta.sort_values('period_ending', ascending=True)
 
-    for _, stub in sorted_stubs.iterrows():
+    # Typed result columns, filled by position
+    n = len(sorted_stubs)
+    pe_arr = np.empty(n, dtype=object)
+    expected_arr = np.empty(n)
+    actual_arr = np.empty(n)
+    diff_arr = np.empty(n)
+    balance_arr = np.empty(n)
+    status_arr = np.empty(n, dtype=object)
+
+    # Stubs share a handful of years, so look each schedule up once
+    sched_cache = {}
+    audited_periods = models.get_audited_periods()
+    timesheets = models.load_timesheets_v2_bulk(
+        [pe for pe in sorted_stubs['period_ending'].unique() if pe in audited_periods]
+    )
+
+    for i, (_, stub) in enumerate(sorted_stubs.iterrows()):
         pe = stub['period_ending']
         cur_rate, cur_ded, cur_earn = models.get_reference_data(stub['id'])
         pe_date = datetime.strptime(pe, "%Y-%m-%d")
-        hist_sched = models.get_user_schedule(pe_date.year).set_index('day_of_week')
+        if pe_date.year not in sched_cache:
+            sched_cache[pe_date.year] = schedule_to_dict(models.get_user_schedule(pe_date.year).set_index('day_of_week'))
+        hist_sched = sched_cache[pe_date.year]
 
-        is_audited = models.has_saved_timesheet(pe) 
+        is_audited = pe in audited_periods
 
         if not is_audited:
             expected_gross = stub['gross_pay']
             diff = 0.0
             status = "⚪ Unaudited"
         else:
-            ts_v2 = models.load_timesheet_v2(pe)
+            ts_v2 = timesheets[pe]
             bucket_rows = []
             for _, row in ts_v2.iterrows():
                 s_raw = row['Start']
                 e_raw = row['End']
-                s_obj = pd.to_datetime(s_raw, format='%H:%M').time() if s_raw and s_raw != "None" else None
-                e_obj = pd.to_datetime(e_raw, format='%H:%M').time() if e_raw and e_raw != "None" else None
+                s_obj = parse_hhmm(s_raw)
+                e_obj = parse_hhmm(e_raw)
                 
                 # --- THIS LINE DEFINES 'b' ---
                 b = calculate_daily_breakdown(
@@ -50,12 +80,12 @@ def generate_shutdown_ledger(stubs_meta, ref_rate, ref_ded, ref_earn, std_sched_
                 )
                 bucket_rows.append(b)
             
-            # Use the correct columns including Leave_Hrs
-            cols = ["Regular", "Overtime", "Night", "Sunday", "Holiday", "Hol_Leave", "Leave_Hrs", "OJTI", "CIC"]
-            buckets = pd.DataFrame(bucket_rows, columns=cols)
-            buckets = buckets.fillna(0.0)
+            # Sum buckets straight from the rows (including Leave_Hrs) - no DataFrame needed
+            totals = {}
+            if bucket_rows:
+                totals = {c: float(np.nansum(np.array([b[c] for b in bucket_rows], dtype=float))) for c in BUCKET_COLS}
 
-            exp_data = calculate_expected_pay(buckets, cur_rate, stub, pd.DataFrame(), pd.DataFrame(), cur_earn)
+            exp_data = calculate_expected_pay_from_totals(totals, cur_rate, stub, pd.DataFrame(), pd.DataFrame(), cur_earn)
             expected_gross = exp_data['stub']['gross_pay']
             
             diff = stub['gross_pay'] - expected_gross
@@ -65,16 +95,21 @@ def generate_shutdown_ledger(stubs_meta, ref_rate, ref_ded, ref_earn, std_sched_
             elif diff > 1.0: status = "🟢 Backpay/Surplus"
 
         running_balance += diff
-        ledger.append({
-            "Period Ending": pe,
-            "Expected": expected_gross,
-            "Actual": stub['gross_pay'],
-            "Diff": diff,
-            "Balance": running_balance,
-            "Status": status
-        })
-
-    return pd.DataFrame(ledger)
+        pe_arr[i] = pe
+        expected_arr[i] = expected_gross
+        actual_arr[i] = stub['gross_pay']
+        diff_arr[i] = diff
+        balance_arr[i] = running_balance
+        status_arr[i] = status
+
+    return pd.DataFrame({
+        "Period Ending": pe_arr,
+        "Expected": expected_arr,
+        "Actual": actual_arr,
+        "Diff": diff_arr,
+        "Balance": balance_arr,
+        "Status": status_arr
+    })
 
 # --- 2. Audit Math (Leave & Gross/Net) ---
 def run_full_audit(data):
@@ -109,58 +144,70 @@ def run_full_audit(data):
     return flags
 
 # --- 3. Time Engine (V2) ---
+def schedule_to_dict(schedule_df):
+    """
+    Flattens a schedule indexed by day_of_week into {weekday: (is_workday, start_time, end_time)}.
+    Plain dict lookups avoid pandas label indexing in the per-day loops. Dicts pass through as-is.
+    """
+    if isinstance(schedule_df, dict):
+        return schedule_df
+    return {
+        int(wd): (bool(r.get('is_workday')), r.get('start_time'), r.get('end_time'))
+        for wd, r in schedule_df.to_dict('index').items()
+    }
+
+@functools.lru_cache(maxsize=32)
+def _holiday_offsets(workday_bits):
+    """
+    Slide Rule as a table: day offset to the observed date for a holiday on each weekday.
+    workday_bits[wd] is True/False, or None when the schedule has no row for that day.
+    """
+    offsets = []
+    for wd in range(7):
+        is_work = workday_bits[wd]
+        # 1. If holiday falls on a Workday, that is the holiday.
+        #    Fallback if schedule is incomplete: assume standard M-F
+        if is_work or (is_work is None and wd < 5):
+            offsets.append(0)
+            continue
+
+        # 2. If holiday falls on RDO:
+        # Rule: If Sunday (6), slide forward to next workday. 
+        #       If any other day (usually Sat), slide back to previous workday.
+        # No workday at all -> fall back to the holiday itself
+        direction = 1 if wd == 6 else -1
+        offsets.append(next((k * direction for k in range(1, 7) if workday_bits[(wd + k * direction) % 7]), 0))
+    return tuple(offsets)
+
 def get_observed_holiday(date_obj, schedule_df):
     """
     Determines the 'In-Lieu-Of' date for a given holiday based on RDOs (ATC Slide Rule).
-    schedule_df must be indexed by day_of_week (0=Mon, 6=Sun) with 'is_workday' bool.
+    schedule_df is either indexed by day_of_week (0=Mon, 6=Sun) with 'is_workday' bool,
+    or the dict form from schedule_to_dict().
     """
-    wd = date_obj.weekday()
-    
-    # 1. If holiday falls on a Workday, that is the holiday.
-    # Safety: Use .get() or try/except to handle missing schedule rows
-    try:
-        if schedule_df.loc[wd, 'is_workday']:
-            return date_obj
-    except (KeyError, IndexError):
-        # Fallback if schedule is incomplete: assume standard M-F
-        if wd < 5: return date_obj
-
-    # 2. If holiday falls on RDO:
-    # Rule: If Sunday (6), slide forward to next workday. 
-    #       If any other day (usually Sat), slide back to previous workday.
-    offset = 1
-    direction = 1 if wd == 6 else -1
-    
-    # Safety breakout to prevent infinite loops if schedule is empty
-    attempts = 0
-    while attempts < 14:
-        check_date = date_obj + timedelta(days=(offset * direction))
-        try:
-            if schedule_df.loc[check_date.weekday(), 'is_workday']:
-                return check_date
-        except (KeyError, IndexError):
-            pass # Keep looking
-            
-        offset += 1
-        attempts += 1
-    
-    return date_obj # Fallback
+    sched = schedule_to_dict(schedule_df)
+    workday_bits = tuple(sched[i][0] if i in sched else None for i in range(7))
+    return date_obj + timedelta(days=_holiday_offsets(workday_bits)[date_obj.weekday()])
+
+def _slot_overlap(s_min, n_slots, lo, hi):
+    """Number of 15-min slots (s_min + 15k, k < n_slots) that start inside [lo, hi)."""
+    first = max(0, -((s_min - lo) // 15))
+    last = min(n_slots, -((s_min - hi) // 15))
+    return max(0, last - first)
 
 def calculate_daily_breakdown(date_str, act_start, act_end, leave_type, ojti, cic, std_sched_df):
     # --- SETUP ---
     dt_obj = datetime.strptime(date_str, "%Y-%m-%d")
     current_date = dt_obj.date()
     wd = dt_obj.weekday()
+    sched = schedule_to_dict(std_sched_df)
     
     # 1. Determine "Observed Holiday" using JSON loader
-    all_holidays = load_holidays()
-    year_str = str(dt_obj.year)
-    year_holidays = all_holidays.get(year_str, [])
+    year_holidays = load_holidays().get(dt_obj.year, [])
     
     is_observed_holiday = False
-    for h_str in year_holidays:
-        h_date = datetime.strptime(h_str, "%Y-%m-%d").date()
-        obs_date = get_observed_holiday(h_date, std_sched_df)
+    for h_date in year_holidays:
+        obs_date = get_observed_holiday(h_date, sched)
         if obs_date == current_date:
             is_observed_holiday = True
             break
@@ -170,13 +217,12 @@ def calculate_daily_breakdown(date_str, act_start, act_end, leave_type, ojti, ci
     is_workday = False
     std_hours = 0.0
     
-    if wd in std_sched_df.index:
-        std_row = std_sched_df.loc[wd]
-        is_workday = std_row['is_workday']
+    if wd in sched:
+        is_workday, std_start, std_end = sched[wd]
         
-        if is_workday and std_row['start_time'] and std_row['end_time']:
-            s_std = datetime.strptime(std_row['start_time'], "%H:%M")
-            e_std = datetime.strptime(std_row['end_time'], "%H:%M")
+        if is_workday and std_start and std_end:
+            s_std = datetime.strptime(std_start, "%H:%M")
+            e_std = datetime.strptime(std_end, "%H:%M")
             if e_std <= s_std: e_std += timedelta(days=1)
             std_hours = (e_std - s_std).total_seconds() / 3600.0
 
@@ -202,20 +248,23 @@ def calculate_daily_breakdown(date_str, act_start, act_end, leave_type, ojti, ci
             worked_hours = (e_act - s_act).total_seconds() / 3600.0
             
             # --- DIFFERENTIALS ---
-            # We track "Calendar Sunday" hours inside the loop for Overtime shifts
-            calendar_sunday_hours = 0.0
-            
-            cursor = s_act
-            while cursor < e_act:
-                # 1. Night Diff
-                if cursor.hour >= 18 or cursor.hour < 6: 
-                    night += 0.25
-                
-                # 2. Calendar Sunday (Strict Accumulation)
-                if cursor.weekday() == 6:
-                    calendar_sunday_hours += 0.25
-
-                cursor += timedelta(minutes=15)
+            # Shift is billed in 15-min slots starting at s_act; count the slots that start
+            # inside each window. Minutes are measured from midnight of the start day.
+            day0 = datetime.combine(s_act.date(), datetime.min.time())
+            s_min = int((s_act - day0).total_seconds() // 60)
+            n_slots = -(-int((e_act - s_act).total_seconds() // 60) // 15)
+
+            # 1. Night Diff: 18:00-06:00 windows around each of the (at most) two days touched
+            night = 0.25 * sum(
+                _slot_overlap(s_min, n_slots, k * 1440 + 18 * 60, k * 1440 + 30 * 60)
+                for k in (-1, 0, 1)
+            )
+
+            # 2. Calendar Sunday (Strict Accumulation) - tracked for Overtime shifts
+            calendar_sunday_hours = 0.25 * sum(
+                _slot_overlap(s_min, n_slots, d * 1440, (d + 1) * 1440) * ((day0.weekday() + d) % 7 == 6)
+                for d in (0, 1)
+            )
             
             # --- SUNDAY PREMIUM DECISION LOGIC ---
             if is_workday:
@@ -275,28 +324,25 @@ def truncate_hours(val):
     """Truncates to 4 decimal places to match legacy payroll systems."""
     return math.floor(val * 10000) / 10000.0
 
-def fmt_hours(val):
-    if not val or val < 0.001: return ""
-    total_minutes = int(round(val * 60))
-    h = total_minutes // 60
-    m = total_minutes % 60
-    return f"{h}:{m:02d}"
-
 def gov_floor(val):
     """Floors to 2 decimal places (cuts off the partial penny) instead of rounding."""
     return math.floor(val * 100) / 100.0
     
+BUCKET_COLS = ["Regular", "Overtime", "Night", "Sunday", "Holiday", "Hol_Leave", "Leave_Hrs", "OJTI", "CIC"]
+LEAVE_COLS = ['type', 'balance_start', 'earned_current', 'used_current', 'balance_end']
+EMPTY_LEAVE_DF = pd.DataFrame(columns=LEAVE_COLS)
+
 def calculate_expected_pay(buckets_df, base_rate, actual_meta, ref_deductions, actual_leave, ref_earnings):
-    # 1. Truncate all buckets
-    t_reg = truncate_hours(buckets_df['Regular'].sum())
-    t_ot = truncate_hours(buckets_df['Overtime'].sum())
-    t_night = truncate_hours(buckets_df['Night'].sum())
-    t_sun = truncate_hours(buckets_df['Sunday'].sum())
-    t_hol_work = truncate_hours(buckets_df['Holiday'].sum())
-    t_leave_reg = truncate_hours(buckets_df.get('Leave_Hrs', pd.Series(0.0)).sum())    
-    t_hol_leave = truncate_hours(buckets_df.get('Hol_Leave', pd.Series(0.0)).sum())
-    t_ojti = truncate_hours(buckets_df['OJTI'].sum())
-    t_cic = truncate_hours(buckets_df['CIC'].sum())
+    """Sums the daily buckets and builds the expected paystub (see calculate_expected_pay_from_totals)."""
+    totals = buckets_df.reindex(columns=BUCKET_COLS, fill_value=0.0).sum().to_dict()
+    return calculate_expected_pay_from_totals(totals, base_rate, actual_meta, ref_deductions, actual_leave, ref_earnings)
+
+def calculate_expected_pay_from_totals(totals, base_rate, actual_meta, ref_deductions, actual_leave, ref_earnings):
+    """Same as calculate_expected_pay, but takes pre-summed bucket hours {bucket: hours}; missing buckets count as 0."""
+    # 1. Truncate all buckets (same 4-decimal floor as truncate_hours, one array op)
+    sums = np.array([totals.get(c, 0.0) for c in BUCKET_COLS], dtype=float)
+    (t_reg, t_ot, t_night, t_sun, t_hol_work,
+     t_hol_leave, t_leave_reg, t_ojti, t_cic) = (np.floor(sums * 10000) / 10000.0).tolist()
 
     # 2. Aggregate Regular Pay (Worked + Holiday Leave + Annual/Sick/Credit Leave)
     total_reg_hours = truncate_hours(t_reg + t_hol_leave + t_leave_reg)
@@ -319,15 +365,29 @@ def calculate_expected_pay(buckets_df, base_rate, actual_meta, ref_deductions, a
     r_cic = round(base_rate * 0.10, 2)
     amt_cic = gov_floor(t_cic * r_cic)
     
+    # Index reference earnings once: lowercase type -> (amount_current, amount_ytd), first row wins.
+    # to_numpy() keeps the numpy scalars the old .iloc lookups returned: round() on np.float64
+    # rounds half-cents differently from round() on a Python float, and that shows up in CIP/FLSA.
+    ref_idx = {}
+    if not ref_earnings.empty:
+        for t, cur, ytd in zip(ref_earnings['type'].to_numpy(), ref_earnings['amount_current'].to_numpy(),
+                               ref_earnings['amount_ytd'].to_numpy()):
+            if isinstance(t, str):
+                ref_idx.setdefault(t.lower(), (cur, ytd))
+
+    def find_ref(type_name):
+        needle = type_name.lower()
+        return next((v for k, v in ref_idx.items() if needle in k), None)
+
     # 6. CIP Logic
     amt_cip = 0.0
     r_cip = 0.0
-    if not ref_earnings.empty:
-        cip_row = ref_earnings[ref_earnings['type'].str.contains('Controller Incentive', case=False, na=False)]
-        reg_row = ref_earnings[ref_earnings['type'].str.contains('Regular', case=False, na=False)]
-        if not cip_row.empty and not reg_row.empty:
-            hist_cip = cip_row.iloc[0]['amount_current']
-            hist_reg = reg_row.iloc[0]['amount_current']
+    if ref_idx:
+        cip_ref = find_ref('Controller Incentive')
+        reg_ref = find_ref('Regular')
+        if cip_ref is not None and reg_ref is not None:
+            hist_cip = cip_ref[0]
+            hist_reg = reg_ref[0]
             if hist_reg > 0:
                 factor = hist_cip / hist_reg
                 amt_cip = round(amt_reg_total * factor, 2)
@@ -347,38 +407,42 @@ def calculate_expected_pay(buckets_df, base_rate, actual_meta, ref_deductions, a
     # 8. Calculate Gross & Deductions
     gross = amt_reg_total + amt_true_ot + amt_flsa + amt_night + amt_sun + amt_hol + amt_cip + amt_ojti + amt_cic
     
-    deduction_rows = []
     total_deducs = 0.0
-    PERCENTAGE_BASED = ['Federal Tax', 'State Tax', 'OASDI', 'Medicare', 'FERS', 'TSP'] 
+    PERCENTAGE_BASED = ['Federal Tax', 'State Tax', 'OASDI', 'Medicare', 'FERS', 'TSP']
     ref_gross = ref_earnings['amount_current'].sum() if not ref_earnings.empty else 1.0
-    
+
+    d_df = pd.DataFrame()
     if not ref_deductions.empty:
-        for _, row in ref_deductions.iterrows():
-            d_type = row['type']
-            ref_amt = row['amount_current']
-            ref_ytd = row.get('amount_ytd', 0.0)
-            
-            new_amt = ref_amt 
-            is_variable = any(x in d_type for x in PERCENTAGE_BASED)
-            if is_variable and ref_gross > 0:
-                effective_rate = ref_amt / ref_gross
-                new_amt = round(gross * effective_rate, 2)
-            
-            new_ytd = round(ref_ytd - ref_amt + new_amt, 2) if (ref_ytd is not None and ref_ytd > 0) else None
+        # Whole-column math: percentage-based deductions scale with gross, the rest carry over as-is
+        ref_amt = ref_deductions['amount_current'].to_numpy(dtype=float)
+        if 'amount_ytd' in ref_deductions:
+            ref_ytd = ref_deductions['amount_ytd'].to_numpy(dtype=float)
+        else:
+            ref_ytd = np.zeros_like(ref_amt)
 
-            deduction_rows.append({'type': d_type, 'amount_current': new_amt, 'amount_ytd': new_ytd, 'code': row.get('code', '')})
-            total_deducs += new_amt
+        is_var = ref_deductions['type'].str.contains('|'.join(PERCENTAGE_BASED), regex=True, na=False).to_numpy()
+        if ref_gross > 0:
+            new_amt = np.where(is_var, np.round(gross * (ref_amt / ref_gross), 2), ref_amt)
+        else:
+            new_amt = ref_amt
+
+        has_ytd = np.nan_to_num(ref_ytd) > 0
+        new_ytd = np.where(has_ytd, np.round(ref_ytd - ref_amt + new_amt, 2), np.nan)
+
+        d_df['type'] = ref_deductions['type'].to_numpy()
+        d_df['amount_current'] = new_amt
+        d_df['amount_ytd'] = new_ytd
+        d_df['code'] = ref_deductions['code'].to_numpy() if 'code' in ref_deductions else ''
+        total_deducs = float(new_amt.sum())
 
-    d_df = pd.DataFrame(deduction_rows)
     net = gross - total_deducs
 
     # 9. Build Earnings Rows
     def get_ref_ytd(type_name, new_current):
         if ref_earnings.empty: return new_current
-        match = ref_earnings[ref_earnings['type'].str.contains(type_name, case=False, regex=False, na=False)]
-        if not match.empty:
-            r_ytd = match.iloc[0]['amount_ytd']
-            r_curr = match.iloc[0]['amount_current']
+        match = find_ref(type_name)
+        if match is not None:
+            r_curr, r_ytd = match
             if r_ytd is not None and r_ytd > 0.01:
                 return round(r_ytd - r_curr + new_current, 2)
         return None 
@@ -410,12 +474,18 @@ def calculate_expected_pay(buckets_df, base_rate, actual_meta, ref_deductions, a
     e_df = pd.DataFrame(rows, columns=['type', 'rate', 'hours_current', 'amount_current', 'amount_ytd'])
     
     # Apply formatting (This fixes 72:00 vs 80:00 display)
-    e_df['hours_current'] = e_df['hours_current'].apply(fmt_hours)
-
-    # 10. Leave Recalc
-    l_rows = []
-    target_leaves = ['Annual', 'Sick', 'Credit']
-    if not actual_leave.empty:
+    hrs = e_df['hours_current'].astype(float).fillna(0.0)
+    m_total = (hrs * 60).round().astype(int)
+    h, m = np.divmod(m_total, 60)
+    hhmm = h.astype(str) + ":" + m.astype(str).str.zfill(2)
+    e_df['hours_current'] = hhmm.where(hrs >= 0.001, "")
+
+    # 10. Leave Recalc (ledger/projected runs pass no leave - skip straight to the empty frame)
+    if actual_leave.empty:
+        l_df = EMPTY_LEAVE_DF.copy()
+    else:
+        l_rows = []
+        target_leaves = ['Annual', 'Sick', 'Credit']
         for _, row in actual_leave.iterrows():
             if any(x in row['type'] for x in target_leaves):
                 bal_start = row.get('balance_start', 0.0)
@@ -428,7 +498,7 @@ def calculate_expected_pay(buckets_df, base_rate, actual_meta, ref_deductions, a
                     'used_current': 0.0, 
                     'balance_end': end
                 })
-    l_df = pd.DataFrame(l_rows)
+        l_df = pd.DataFrame(l_rows, columns=LEAVE_COLS)
 
     stub = actual_meta.copy()
     # If actual_meta is a series/dict, we update it. If it's a DF row, handles similarly.
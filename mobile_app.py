@@ -1,8 +1,15 @@
 import flet as ft
 import sqlite3
 import requests
-import json
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import ijson
+import orjson
 import os
+import threading
+import zlib
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 # --- CONFIGURATION ---
@@ -14,9 +21,234 @@ if "ANDROID_ARGUMENT" in os.environ:
 else:
     DB_NAME = "mobile_data.db"
 
+# One long-lived connection shared by every handler (opened in init_db).
+# Flet callbacks can arrive on different threads, so access goes through _DB_LOCK.
+_CONN = None
+_DB_LOCK = threading.RLock()
+
+# schedule_defaults is tiny and only changes on download: (year, day_idx) -> (start, end)
+_SCHED_CACHE = {}
+
+# Keep-alive session so the download/sync calls reuse one socket to the desktop
+# (requests already advertises Accept-Encoding: gzip and decodes the replies)
+# (connect, read): if the desktop isn't on the LAN we know in 1.5 s instead of waiting out the read timeout
+HTTP_TIMEOUT = (1.5, 4.0)
+
+# One connect retry and one read retry with backoff ride out a Wi-Fi blip; 502/503/504 are retried for GETs
+# (urllib3 never replays a POST on read errors or bad status)
+SESSION = requests.Session()
+_RETRY = Retry(total=2, connect=1, read=1, backoff_factor=0.3,
+               status_forcelist=(502, 503, 504), raise_on_status=False)
+SESSION.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=4, max_retries=_RETRY))
+SESSION.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=4, max_retries=_RETRY))
+
+LEAVE_TYPES = ("None", "Annual", "Sick", "Holiday", "Credit", "Comp", "LWOP")
+
+# --- SQL (module constants so the connection's statement cache always hits) ---
+# A day's saved data, tagged by source: q = local draft, a = desktop (defaults come from _SCHED_CACHE).
+# Hours columns come back as ojti_hours / cic_hours for both sources.
+SQL_LOAD_DAY = """
+    SELECT 'q' AS src, start_time, end_time, leave_type, ojti_minutes / 60.0 AS ojti_hours, cic_minutes / 60.0 AS cic_hours FROM offline_queue WHERE day_date=?
+    UNION ALL
+    SELECT 'a', start_time, end_time, leave_type, ojti_hours, cic_hours FROM server_actuals WHERE day_date=?
+"""
+SQL_INSERT_QUEUE = """
+    INSERT INTO offline_queue 
+    (day_date, start_time, end_time, leave_type, ojti_minutes, cic_minutes, timestamp) 
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+SQL_SELECT_PENDING = "SELECT id, day_date, start_time, end_time, leave_type, ojti_minutes, cic_minutes FROM offline_queue ORDER BY day_date DESC, id"
+# The desktop still takes OJTI/CIC as hours
+SQL_SELECT_SYNC = """
+    SELECT id, day_date, start_time, end_time, leave_type,
+           ojti_minutes / 60.0 AS ojti_hours, cic_minutes / 60.0 AS cic_hours, timestamp
+    FROM offline_queue
+"""
+SQL_SELECT_HOLIDAYS = "SELECT name, date, day FROM holiday_cache WHERE year >= ? ORDER BY date"
+SQL_SELECT_SCHED = "SELECT year, day_idx, start_time, end_time FROM schedule_defaults"
+
+# Download writes
+SQL_INSERT_SCHED = "INSERT INTO schedule_defaults VALUES (?,?,?,?)"
+SQL_INSERT_ACTUALS = """
+    INSERT INTO server_actuals (day_date, start_time, end_time, leave_type, ojti_hours, cic_hours)
+    VALUES (?, ?, ?, ?, ?, ?)
+"""
+SQL_INSERT_HOL = "INSERT INTO holiday_cache VALUES (?,?,?,?)"
+
+# --- HOURS HELPERS ---
+def parse_time(val):
+    """Convert "1:30" (or "1.5" hours) -> 90 minutes; blank -> 0"""
+    val = val.strip()
+    if not val: return 0
+    if len(val) == 5 and val[2] == ":":  # the usual "HH:MM"
+        return int(val[:2]) * 60 + int(val[3:])
+    if ":" in val:
+        parts = val.split(":")
+        return int(parts[0]) * 60 + int(parts[1])
+    return int(round(float(val) * 60))
+
+def normalize_hhmm(val):
+    """Tidy typed time: "0730" -> "07:30", "730" -> "07:30", "7" -> "07:00", "7:5" -> "07:05"; anything else unchanged"""
+    val = (val or "").strip()
+    if ":" in val:
+        h, _, m = val.partition(":")
+    elif val.isdigit() and len(val) <= 4:
+        h, m = (val[:-2], val[-2:]) if len(val) > 2 else (val, "0")
+    else:
+        return val
+    if not (h.isdigit() and m.isdigit()):
+        return val
+    return f"{int(h):02d}:{int(m):02d}"
+
+def fmt_hours(minutes):
+    """Convert 90 minutes -> "1:30"; blank/zero -> "-" """
+    if not minutes or minutes <= 0: return "-"
+    h, m = divmod(int(minutes), 60)
+    return f"{h}:{m:02d}"
+
+def version_tuple(v):
+    """Convert "1.10" -> (1, 10) so versions compare numerically (non-numeric parts are ignored)"""
+    return tuple(int(x) for x in str(v).split(".") if x.isdigit())
+
+def iter_json_rows(rows):
+    """Encodes rows (sqlite3.Row) as a JSON array one row at a time (for a streamed request body)."""
+    yield b'['
+    for i, row in enumerate(rows):
+        yield (b',' if i else b'') + orjson.dumps(dict(row))
+    yield b']'
+
+def gzip_stream(chunks):
+    """Gzip-compresses a stream of byte chunks on the fly (level 1: near-free on the phone CPU)."""
+    z = zlib.compressobj(1, zlib.DEFLATED, 31)  # wbits=31 -> gzip container
+    for chunk in chunks:
+        out = z.compress(chunk)
+        if out:
+            yield out
+    yield z.flush()
+
+# Desktop JSON -> local table row tuples
+def sched_row(i): return (i['year'], i['day'], i['start'], i['end'])
+def shift_row(s): return (s['date'], s['start'], s['end'], s['leave'], s['ojti'], s['cic'])
+def hol_row(h): return (h['year'], h['name'], h['date'], h['day'])
+
+def fetch_rows(url, to_row):
+    """GETs a JSON array and converts each element with to_row; None if the desktop didn't answer 200."""
+    with SESSION.get(url, timeout=HTTP_TIMEOUT, stream=True) as r:
+        if r.status_code != 200:
+            return None
+        return [to_row(x) for x in iter_json_items(r)]
+
+def iter_json_items(r):
+    """Parses a streamed JSON array response one element at a time instead of loading the whole body."""
+    r.raw.decode_content = True
+    return ijson.items(r.raw, 'item', use_float=True)
+
+def sync_table_rows(table, cache, items, make_row):
+    """
+    Refreshes a DataTable in place. items is [(key, cell_values)]; rows already in
+    cache for a key are reused and only their changed cell text is touched. Rows that
+    drop out are hidden and recycled for new keys, so a steady-state refresh allocates nothing.
+    Returns True if anything visible changed (i.e. the table needs an update).
+    """
+    changed = False
+    fresh = {key: cache[key] for key, _ in items if key in cache}
+    kept = {id(r) for r in fresh.values()}
+    spare = [r for r in table.rows if id(r) not in kept]
+
+    rows = []
+    for key, values in items:
+        row = fresh.get(key)
+        if row is None:
+            row = spare.pop() if spare else make_row(values)
+            fresh[key] = row
+        for cell, v in zip(row.cells, values):
+            if cell.content.value != v:
+                cell.content.value = v
+                changed = True
+        if row.visible is False:
+            row.visible = True
+            changed = True
+        rows.append(row)
+
+    for row in spare:
+        if row.visible is not False:
+            row.visible = False
+            changed = True
+    new_order = rows + spare
+    if changed or [id(r) for r in new_order] != [id(r) for r in table.rows]:
+        table.rows[:] = new_order
+        changed = True
+    cache.clear()
+    cache.update(fresh)
+    return changed
+
+def reload_sched():
+    """Refreshes _SCHED_CACHE from schedule_defaults (startup and after each download)."""
+    with _DB_LOCK:
+        rows = _CONN.execute(SQL_SELECT_SCHED).fetchall()
+    _SCHED_CACHE.clear()
+    for y, d, s, e in rows:
+        _SCHED_CACHE[(y, d)] = (s, e)
+
+@contextmanager
+def db_transaction():
+    """Runs a block of writes on the shared connection as one explicit transaction."""
+    with _DB_LOCK:
+        # IMMEDIATE takes the write lock up front instead of upgrading mid-transaction
+        _CONN.execute("BEGIN IMMEDIATE")
+        try:
+            yield _CONN
+        except BaseException:
+            _CONN.execute("ROLLBACK")
+            raise
+        _CONN.execute("COMMIT")
+
+def _connect(path=None):
+    """Opens a connection with the app's PRAGMAs (synchronous etc. are per-connection, so always go through here)."""
+    path = path or DB_NAME
+    conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, cached_statements=256)
+    conn.row_factory = sqlite3.Row
+    # WAL + relaxed sync: avoids an fsync per insert on phone flash storage
+    # (journal_mode / mmap don't apply to an in-memory DB)
+    if not path.endswith(":memory:"):
+        # auto_vacuum must be chosen before WAL/tables touch a fresh file (init_db converts old files)
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA mmap_size=134217728")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA cache_size=-64000")
+    return conn
+
+def close_db():
+    """Vacuums/optimizes and closes the shared connection (checkpoints the WAL); init_db() reopens it."""
+    global _CONN
+    with _DB_LOCK:
+        if _CONN is not None:
+            # Hand back pages the queue churn freed, and refresh planner stats
+            _CONN.executescript("PRAGMA incremental_vacuum;")  # execute() would only free one page
+            _CONN.execute("PRAGMA optimize")
+            _CONN.close()
+            _CONN = None
+
 def init_db():
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
+    global _CONN
+    if _CONN is None:
+        _CONN = _connect()
+    c = _CONN.cursor()
+
+    # Incremental auto-vacuum so the file shrinks back after syncs (close_db() runs it).
+    # A fresh DB picked the setting up in _connect(); an older file needs a single VACUUM to switch over.
+    if c.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        c.execute("VACUUM")
+
+    # One-shot migration: the queue used to store OJTI/CIC as REAL hours, now INTEGER minutes
+    queue_cols = [r['name'] for r in c.execute("PRAGMA table_info(offline_queue)")]
+    migrate_queue = 'ojti_hours' in queue_cols
+    if migrate_queue:
+        c.execute("BEGIN")
+        c.execute("ALTER TABLE offline_queue RENAME TO offline_queue_old")
+
     c.execute('''
         CREATE TABLE IF NOT EXISTS offline_queue (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -24,11 +256,31 @@ def init_db():
             start_time TEXT,
             end_time TEXT,
             leave_type TEXT,
-            ojti_hours REAL,
-            cic_hours REAL,
+            ojti_minutes INTEGER,
+            cic_minutes INTEGER,
             timestamp TEXT
         )
     ''')
+
+    if migrate_queue:
+        c.execute("""
+            INSERT INTO offline_queue (id, day_date, start_time, end_time, leave_type, ojti_minutes, cic_minutes, timestamp)
+            SELECT id, day_date, start_time, end_time, leave_type,
+                   CAST(ROUND(COALESCE(ojti_hours, 0) * 60) AS INTEGER),
+                   CAST(ROUND(COALESCE(cic_hours, 0) * 60) AS INTEGER),
+                   timestamp
+            FROM offline_queue_old
+        """)
+        c.execute("DROP TABLE offline_queue_old")
+        c.execute("COMMIT")
+
+    # schedule_defaults is WITHOUT ROWID (the PK b-tree is the table); rebuild an older rowid copy once
+    sched_sql = c.execute("SELECT sql FROM sqlite_master WHERE type='table' AND name='schedule_defaults'").fetchone()
+    migrate_sched = sched_sql is not None and "WITHOUT ROWID" not in sched_sql['sql'].upper()
+    if migrate_sched:
+        c.execute("BEGIN")
+        c.execute("ALTER TABLE schedule_defaults RENAME TO schedule_defaults_old")
+
     c.execute('''
         CREATE TABLE IF NOT EXISTS schedule_defaults (
             year INTEGER,
@@ -36,8 +288,14 @@ def init_db():
             start_time TEXT,
             end_time TEXT,
             PRIMARY KEY (year, day_idx)
-        )
+        ) WITHOUT ROWID
     ''')
+
+    if migrate_sched:
+        c.execute("INSERT INTO schedule_defaults SELECT year, day_idx, start_time, end_time FROM schedule_defaults_old")
+        c.execute("DROP TABLE schedule_defaults_old")
+        c.execute("COMMIT")
+
     c.execute('''
         CREATE TABLE IF NOT EXISTS holiday_cache (
             year INTEGER,
@@ -56,37 +314,53 @@ def init_db():
             cic_hours REAL
         )
     ''')
-    conn.commit()
-    conn.close()
+    # server_actuals.day_date is already the primary key; the queue and holiday cache need their own
+    c.execute("CREATE INDEX IF NOT EXISTS idx_queue_date ON offline_queue(day_date)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_holiday_year_date ON holiday_cache(year, date)")
+
+    reload_sched()
 
 def main(page: ft.Page):
     APP_VERSION = "1.2"
     UPDATE_URL = "https://ee-paytracker.s3.us-east-1.amazonaws.com/version.json"
+    UPDATE_CHECK_TTL = 24 * 3600  # seconds between version.json fetches
     page.title = "FAA PayTracker"
     page.theme_mode = ft.ThemeMode.LIGHT
     page.window_width = 400
     page.window_height = 800
     
     init_db()
+    page.on_close = lambda _: close_db()
 
     # --- SETTINGS LOGIC ---
     stored_ip = page.client_storage.get("server_ip")
     current_ip = stored_ip if stored_ip else DEFAULT_IP
 
     def check_for_update():
-        try:
-            # Short timeout so app doesn't hang if offline
-            r = requests.get(UPDATE_URL, timeout=3)
-            if r.status_code == 200:
-                data = r.json()
+        # Only ask S3 once per UPDATE_CHECK_TTL; in between, reuse the cached answer
+        now = datetime.now().timestamp()
+        last = page.client_storage.get("update_checked_at")
+        if last and now - last < UPDATE_CHECK_TTL:
+            latest = page.client_storage.get("update_latest_version") or "0.0.0"
+            apk_url = page.client_storage.get("update_apk_url") or ""
+        else:
+            try:
+                # Short timeout so app doesn't hang if offline
+                r = SESSION.get(UPDATE_URL, timeout=(1.5, 3))
+                if r.status_code != 200:
+                    return
+                data = orjson.loads(r.content)
                 latest = data.get("latest_version", "0.0.0")
                 apk_url = data.get("apk_url", "")
+                page.client_storage.set("update_checked_at", now)
+                page.client_storage.set("update_latest_version", latest)
+                page.client_storage.set("update_apk_url", apk_url)
+            except:
+                return # Fail silently if offline
 
-                # Simple string compare (or use packaging.version for robust handling)
-                if latest > APP_VERSION:
-                    show_update_dialog(latest, apk_url)
-        except:
-            pass # Fail silently if offline
+        # Numeric compare: "1.10" is newer than "1.9"
+        if version_tuple(latest) > version_tuple(APP_VERSION):
+            show_update_dialog(latest, apk_url)
 
     def show_update_dialog(new_ver, url):
         def dl_update(e):
@@ -160,15 +434,19 @@ def main(page: ft.Page):
         expand=True
     )
 
-    def auto_colon(e):
-        prev_len = e.control.data if e.control.data is not None else 0
-        val = e.control.value
-        if len(val) == 2 and len(val) > prev_len and val.isdigit():
-            e.control.value = val + ":"
+    def on_time_blur(e):
+        # Colon goes in once when the field loses focus, not on every keystroke
+        val = normalize_hhmm(e.control.value)
+        if val != e.control.value:
+            e.control.value = val
             e.control.update()
-        e.control.data = len(e.control.value)
+
+    def form_state():
+        return (txt_date.value, txt_start.value, txt_end.value, txt_ojti.value, txt_cic.value,
+                dd_leave.value, lbl_status.value, lbl_status.color)
 
     def change_date(e):
+        before = form_state()
         if date_picker.value:
             new_date = date_picker.value
         else:
@@ -183,14 +461,15 @@ def main(page: ft.Page):
         target_year = new_date.year
         date_str = txt_date.value
         
-        conn = sqlite3.connect(DB_NAME)
-        conn.row_factory = sqlite3.Row 
-        
-        row_q = conn.execute("SELECT * FROM offline_queue WHERE day_date=?", (date_str,)).fetchone()
-        row_act = conn.execute("SELECT * FROM server_actuals WHERE day_date=?", (date_str,)).fetchone()
-        row_def = conn.execute("SELECT start_time, end_time FROM schedule_defaults WHERE year=? AND day_idx=?", (target_year, day_idx)).fetchone()
-        
-        conn.close()
+        with _DB_LOCK:
+            rows = _CONN.execute(SQL_LOAD_DAY, (date_str, date_str)).fetchall()
+
+        # First row per source wins
+        found = {}
+        for r in rows:
+            found.setdefault(r['src'], r)
+        row_q, row_act = found.get('q'), found.get('a')
+        row_def = _SCHED_CACHE.get((target_year, day_idx))
 
         if row_q:
             txt_start.value = row_q['start_time'] if row_q['start_time'] else ""
@@ -209,8 +488,8 @@ def main(page: ft.Page):
             lbl_status.value = "Loaded from Desktop."
             lbl_status.color = "blue"
         elif row_def:
-            txt_start.value = row_def['start_time'] if row_def['start_time'] else ""
-            txt_end.value = row_def['end_time'] if row_def['end_time'] else ""
+            txt_start.value = row_def[0] if row_def[0] else ""
+            txt_end.value = row_def[1] if row_def[1] else ""
             txt_ojti.value = ""
             txt_cic.value = ""
             dd_leave.value = "None"
@@ -223,7 +502,9 @@ def main(page: ft.Page):
             txt_cic.value = ""
             dd_leave.value = "None"
             
-        page.update()
+        # Re-picking the same day reloads identical values; skip the no-op render
+        if form_state() != before:
+            page.update()
 
     date_picker = ft.DatePicker(
         on_change=change_date,
@@ -237,32 +518,26 @@ def main(page: ft.Page):
         on_click=lambda _: setattr(date_picker, 'open', True) or page.update()
     )
 
-    txt_start = ft.TextField(label="Start (HH:MM)", hint_text="07:00", width=160, on_change=auto_colon)
-    txt_end = ft.TextField(label="End (HH:MM)", hint_text="15:00", width=160, on_change=auto_colon)
+    # Digits, ':' and '.' only, filtered on the device; no on_change round trips
+    TIME_FILTER = ft.InputFilter(regex_string=r"^[0-9:.]*$")
+
+    txt_start = ft.TextField(label="Start (HH:MM)", hint_text="07:00", width=160, input_filter=TIME_FILTER, on_blur=on_time_blur)
+    txt_end = ft.TextField(label="End (HH:MM)", hint_text="15:00", width=160, input_filter=TIME_FILTER, on_blur=on_time_blur)
 
     dd_leave = ft.Dropdown(
         label="Leave Type (Optional)",
-        options=[
-            ft.dropdown.Option("None"), ft.dropdown.Option("Annual"),
-            ft.dropdown.Option("Sick"), ft.dropdown.Option("Holiday"),
-            ft.dropdown.Option("Credit"), ft.dropdown.Option("Comp"),
-            ft.dropdown.Option("LWOP"),
-        ],
+        options=[ft.dropdown.Option(x) for x in LEAVE_TYPES],
         value="None"
     )
 
-    txt_ojti = ft.TextField(label="OJTI (HH:MM)", width=160, on_change=auto_colon)
-    txt_cic = ft.TextField(label="CIC (HH:MM)", width=160, on_change=auto_colon)
+    txt_ojti = ft.TextField(label="OJTI (HH:MM)", width=160, input_filter=TIME_FILTER, on_blur=on_time_blur)
+    txt_cic = ft.TextField(label="CIC (HH:MM)", width=160, input_filter=TIME_FILTER, on_blur=on_time_blur)
 
     def save_local_click(e):
         try:
-            def parse_time(val):
-                val = val.strip()
-                if not val: return 0.0
-                if ":" in val:
-                    parts = val.split(":")
-                    return float(parts[0]) + (float(parts[1]) / 60.0)
-                return float(val)
+            # A tap on Save doesn't always blur the field being edited
+            for f in (txt_start, txt_end, txt_ojti, txt_cic):
+                f.value = normalize_hhmm(f.value)
 
             ojti = parse_time(txt_ojti.value)
             cic = parse_time(txt_cic.value)
@@ -273,14 +548,8 @@ def main(page: ft.Page):
             if s_val and len(s_val) != 5: raise ValueError("Start Time must be HH:MM")
             if e_val and len(e_val) != 5: raise ValueError("End Time must be HH:MM")
 
-            conn = sqlite3.connect(DB_NAME)
-            conn.execute("""
-                INSERT INTO offline_queue 
-                (day_date, start_time, end_time, leave_type, ojti_hours, cic_hours, timestamp) 
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (txt_date.value, s_val, e_val, leave_val, ojti, cic, datetime.now().isoformat()))
-            conn.commit()
-            conn.close()
+            with db_transaction() as conn:
+                conn.execute(SQL_INSERT_QUEUE, (txt_date.value, s_val, e_val, leave_val, ojti, cic, datetime.now().isoformat()))
 
             lbl_status.value = f"Saved {txt_date.value}"
             lbl_status.color = "green"
@@ -295,17 +564,28 @@ def main(page: ft.Page):
     def sync_to_pc_click(e):
         lbl_status.value = "Syncing Shifts..."
         page.update()
+        # HTTP + DB work runs off the UI thread so the app doesn't freeze for the timeout
+        page.run_thread(sync_to_pc_worker)
+
+    def sync_to_pc_worker():
         try:
-            conn = sqlite3.connect(DB_NAME)
-            conn.row_factory = sqlite3.Row
-            rows = conn.execute("SELECT * FROM offline_queue").fetchall()
-            
+            # Snapshot the queue under the lock, then release it for the upload so UI handlers aren't blocked
+            with _DB_LOCK:
+                rows = _CONN.execute(SQL_SELECT_SYNC).fetchall()
+            last_id = max((r['id'] for r in rows), default=None)
+
             if rows:
-                payload = [dict(r) for r in rows]
-                r = requests.post(f"{get_url()}/mobile_sync", json=payload, timeout=5)
+                url = f"{get_url()}/mobile_sync"
+                r = SESSION.post(url, data=gzip_stream(iter_json_rows(rows)),
+                                 headers={'Content-Type': 'application/json', 'Content-Encoding': 'gzip'}, timeout=HTTP_TIMEOUT)
+                if r.status_code in (400, 415, 422):
+                    # Older desktop listener can't read a gzipped body; send the same snapshot uncompressed
+                    r = SESSION.post(url, data=iter_json_rows(rows),
+                                     headers={'Content-Type': 'application/json'}, timeout=HTTP_TIMEOUT)
                 if r.status_code == 200:
-                    conn.execute("DELETE FROM offline_queue")
-                    conn.commit()
+                    # Only what was sent: rows queued during the upload have higher ids and stay
+                    with db_transaction() as conn:
+                        conn.execute("DELETE FROM offline_queue WHERE id <= ?", (last_id,))
                     lbl_status.value = f"Synced {len(rows)} entries."
                     lbl_status.color = "green"
                 else:
@@ -313,7 +593,6 @@ def main(page: ft.Page):
                     lbl_status.color = "red"
             else:
                 lbl_status.value = "Queue empty."
-            conn.close()
             
             load_pending_queue()
             
@@ -325,38 +604,72 @@ def main(page: ft.Page):
     def get_updates_click(e):
         lbl_status.value = "Downloading Data..."
         page.update()
+        page.run_thread(get_updates_worker)
+
+    def get_updates_worker():
         try:
-            # 1. Defaults
-            r_sched = requests.get(f"{get_url()}/get_schedule_defaults", timeout=5)
-            conn = sqlite3.connect(DB_NAME)
-            if r_sched.status_code == 200:
-                conn.execute("DELETE FROM schedule_defaults")
-                for i in r_sched.json():
-                    conn.execute("INSERT INTO schedule_defaults VALUES (?,?,?,?)", 
-                                 (i['year'], i['day'], i['start'], i['end']))
-            
-            # 2. Saved Shifts
-            r_shifts = requests.get(f"{get_url()}/get_saved_shifts?year={datetime.now().year}", timeout=5)
-            if r_shifts.status_code == 200:
-                conn.execute("DELETE FROM server_actuals")
-                for s in r_shifts.json():
-                    conn.execute("""
-                        INSERT INTO server_actuals (day_date, start_time, end_time, leave_type, ojti_hours, cic_hours)
-                        VALUES (?, ?, ?, ?, ?, ?)
-                    """, (s['date'], s['start'], s['end'], s['leave'], s['ojti'], s['cic']))
-
-            # 3. Holidays
-            conn.execute("DELETE FROM holiday_cache")
-            years = [datetime.now().year, datetime.now().year + 1]
-            for y in years:
-                r_hol = requests.get(f"{get_url()}/get_holidays?year={y}", timeout=5)
-                if r_hol.status_code == 200:
-                    for h in r_hol.json():
-                        conn.execute("INSERT INTO holiday_cache VALUES (?,?,?,?)", 
-                                     (h['year'], h['name'], h['date'], h['day']))
+            # Fetch everything first so the write transaction isn't held open over the network
+            this_year = datetime.now().year
+            sched_rows = shift_rows = None
+            hol_rows = []
+
+            # Send the last download's ETag so an unchanged desktop answers 304 and we skip the rewrite
+            # (only if the cache actually has data, e.g. not after the DB file was wiped)
+            headers = {}
+            etag = page.client_storage.get("bootstrap_etag")
+            with _DB_LOCK:
+                has_cache = _CONN.execute("SELECT 1 FROM schedule_defaults LIMIT 1").fetchone()
+            if etag and has_cache:
+                headers["If-None-Match"] = etag
+
+            # 1. Single combined call (desktop builds with /mobile_bootstrap)
+            new_etag = None
+            with SESSION.get(f"{get_url()}/mobile_bootstrap?year={this_year}", headers=headers, timeout=HTTP_TIMEOUT, stream=True) as r_boot:
+                if r_boot.status_code == 304:
+                    lbl_status.value = "Up to date."
+                    lbl_status.color = "green"
+                    page.update()
+                    return
+                if r_boot.status_code == 200:
+                    new_etag = r_boot.headers.get("ETag")
+                    r_boot.raw.decode_content = True
+                    for key, items in ijson.kvitems(r_boot.raw, '', use_float=True):
+                        if key == 'schedule':
+                            sched_rows = [sched_row(i) for i in items]
+                        elif key == 'shifts':
+                            shift_rows = [shift_row(s) for s in items]
+                        elif key == 'holidays':
+                            hol_rows = [hol_row(h) for h in items]
+                    boot_ok = True
+                else:
+                    boot_ok = False
+
+            # 2. Older desktop without the combined endpoint: one call per table, issued concurrently
+            if not boot_ok:
+                with ThreadPoolExecutor(max_workers=4) as pool:
+                    f_sched = pool.submit(fetch_rows, f"{get_url()}/get_schedule_defaults", sched_row)
+                    f_shifts = pool.submit(fetch_rows, f"{get_url()}/get_saved_shifts?year={this_year}", shift_row)
+                    f_hols = [pool.submit(fetch_rows, f"{get_url()}/get_holidays?year={y}", hol_row)
+                              for y in [this_year, this_year + 1]]
+                sched_rows = f_sched.result()
+                shift_rows = f_shifts.result()
+                for f in f_hols:
+                    hol_rows.extend(f.result() or [])
+
+            # 3. Write it all in one transaction (rolls back on failure)
+            with db_transaction() as conn:
+                if sched_rows is not None:
+                    conn.execute("DELETE FROM schedule_defaults")
+                    conn.executemany(SQL_INSERT_SCHED, sched_rows)
+                if shift_rows is not None:
+                    conn.execute("DELETE FROM server_actuals")
+                    conn.executemany(SQL_INSERT_ACTUALS, shift_rows)
+                conn.execute("DELETE FROM holiday_cache")
+                conn.executemany(SQL_INSERT_HOL, hol_rows)
+            reload_sched()
+            if new_etag:
+                page.client_storage.set("bootstrap_etag", new_etag)
             
-            conn.commit()
-            conn.close()
             lbl_status.value = "Updates Downloaded!"
             lbl_status.color = "green"
             
@@ -401,24 +714,22 @@ def main(page: ft.Page):
         heading_row_color=ft.Colors.GREY_200,
     )
 
+    holiday_rows = {}  # (date, name) -> DataRow currently shown
+
     def load_holidays_from_db():
-        conn = sqlite3.connect(DB_NAME)
-        rows = conn.execute(
-            "SELECT name, date, day FROM holiday_cache WHERE year >= ? ORDER BY date", 
-            (datetime.now().year,)
-        ).fetchall()
-        conn.close()
+        with _DB_LOCK:
+            rows = _CONN.execute(SQL_SELECT_HOLIDAYS, (datetime.now().year,)).fetchall()
         
-        holiday_table.rows.clear()
-        for name, date, day in rows:
-            holiday_table.rows.append(
-                ft.DataRow(cells=[
-                    ft.DataCell(ft.Text(name, size=12)),
-                    ft.DataCell(ft.Text(date, weight="bold")),
-                    ft.DataCell(ft.Text(day, size=12)),
-                ])
-            )
-        page.update()
+        def make_row(vals):
+            name, date, day = vals
+            return ft.DataRow(cells=[
+                ft.DataCell(ft.Text(name, size=12)),
+                ft.DataCell(ft.Text(date, weight="bold")),
+                ft.DataCell(ft.Text(day, size=12)),
+            ])
+
+        if sync_table_rows(holiday_table, holiday_rows, [((r['date'], r['name']), tuple(r)) for r in rows], make_row):
+            page.update()
 
     tab_holidays_content = ft.Container(
         padding=10,
@@ -446,22 +757,15 @@ def main(page: ft.Page):
         column_spacing=10
     )
 
+    pending_rows = {}  # offline_queue.id -> DataRow currently shown
+
     def load_pending_queue():
-        conn = sqlite3.connect(DB_NAME)
         # Fetch everything exactly as it is in the queue
-        rows = conn.execute("SELECT day_date, start_time, end_time, leave_type, ojti_hours, cic_hours FROM offline_queue ORDER BY day_date DESC").fetchall()
-        conn.close()
+        with _DB_LOCK:
+            rows = _CONN.execute(SQL_SELECT_PENDING).fetchall()
 
-        pending_table.rows.clear()
-        
-        # Helper: Convert 1.5 -> "1:30"
-        def fmt_hours(val):
-            if not val or val <= 0: return "-"
-            h = int(val)
-            m = int(round((val - h) * 60))
-            return f"{h}:{m:02d}"
-
-        for d, s, e, l, o, c in rows:
+        items = []
+        for qid, d, s, e, l, o, c in rows:
             # Display "-" for blanks, but show ALL data regardless of defaults
             s_disp = s if s else "-"
             e_disp = e if e else "-"
@@ -471,18 +775,22 @@ def main(page: ft.Page):
             o_disp = fmt_hours(o)
             c_disp = fmt_hours(c)
 
-            pending_table.rows.append(
-                ft.DataRow(cells=[
-                    ft.DataCell(ft.Text(d, size=12, weight="bold")),
-                    ft.DataCell(ft.Text(s_disp, size=12)),
-                    ft.DataCell(ft.Text(e_disp, size=12)),
-                    ft.DataCell(ft.Text(l_disp, size=12)),
-                    ft.DataCell(ft.Text(o_disp, size=12)), 
-                    ft.DataCell(ft.Text(c_disp, size=12)),  
-                ])
-            )
-        
-        page.update()
+            items.append((qid, (d, s_disp, e_disp, l_disp, o_disp, c_disp)))
+
+        def make_row(vals):
+            d, s_disp, e_disp, l_disp, o_disp, c_disp = vals
+            return ft.DataRow(cells=[
+                ft.DataCell(ft.Text(d, size=12, weight="bold")),
+                ft.DataCell(ft.Text(s_disp, size=12)),
+                ft.DataCell(ft.Text(e_disp, size=12)),
+                ft.DataCell(ft.Text(l_disp, size=12)),
+                ft.DataCell(ft.Text(o_disp, size=12)), 
+                ft.DataCell(ft.Text(c_disp, size=12)),  
+            ])
+
+        # Only new/changed queue rows produce widget churn (and no render at all if nothing changed)
+        if sync_table_rows(pending_table, pending_rows, items, make_row):
+            page.update()
 
     tab_pending_content = ft.Container(
         padding=10,
@@ -506,9 +814,12 @@ def main(page: ft.Page):
     )
 
     page.add(t)
-    load_holidays_from_db()
+    # Holidays tab isn't visible at start; fill it in the background so first paint isn't held up
+    page.run_thread(load_holidays_from_db)
     load_pending_queue()
     change_date(None)
+    # Off the UI thread: a cold start never waits on S3
+    page.run_thread(check_for_update)
 
 if __name__ == "__main__":
     ft.app(target=main)
@@ -1,14 +1,38 @@
 import sqlite3
+import threading
 import pandas as pd
-from datetime import datetime, timedelta
+from datetime import datetime
 
 DB_NAME = 'payroll_audit.db'
 
+# Indexes on the ingest-owned line-item tables: per-stub lookups, and the "last good Regular rate" fallback
+LINE_ITEM_INDEXES = [
+    ('earnings', "CREATE INDEX IF NOT EXISTS idx_earn_pid ON earnings(paystub_id)"),
+    ('deductions', "CREATE INDEX IF NOT EXISTS idx_ded_pid ON deductions(paystub_id)"),
+    ('leave_balances', "CREATE INDEX IF NOT EXISTS idx_leave_pid ON leave_balances(paystub_id)"),
+    ('earnings', "CREATE INDEX IF NOT EXISTS idx_earn_regular ON earnings(id) WHERE type LIKE '%Regular%' AND rate > 0"),
+]
+
+# One long-lived connection per thread (Streamlit runs each session on its own thread)
+_local = threading.local()
+
 def get_db():
-    conn = sqlite3.connect(DB_NAME)
-    conn.row_factory = sqlite3.Row
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        conn = sqlite3.connect(DB_NAME)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA cache_size=-64000")
+        _local.conn = conn
     return conn
 
+def _frame(cur, sql, params):
+    """Runs a query on an existing cursor into a DataFrame (what pd.read_sql does, minus its per-call setup)."""
+    cur.execute(sql, params)
+    return pd.DataFrame.from_records(cur.fetchall(), columns=[d[0] for d in cur.description], coerce_float=True)
+
 def setup_database():
     """Initializes all tables including V2 timesheets and Schedule."""
     conn = get_db()
@@ -32,12 +56,10 @@ def setup_database():
     )''')
     
     # Seed 2025 Schedule if completely empty
-    if pd.read_sql("SELECT count(*) as c FROM user_schedule", conn).iloc[0]['c'] == 0:
+    if conn.execute("SELECT count(*) FROM user_schedule").fetchone()[0] == 0:
         current_year = datetime.now().year
-        for i in range(7):
-            is_work = i < 5 
-            conn.execute("INSERT INTO user_schedule VALUES (?, ?, ?, ?, ?)", 
-                         (current_year, i, "07:00" if is_work else None, "15:00" if is_work else None, is_work))
+        seed = [(current_year, i, "07:00" if i < 5 else None, "15:00" if i < 5 else None, i < 5) for i in range(7)]
+        conn.executemany("INSERT INTO user_schedule VALUES (?, ?, ?, ?, ?)", seed)
 
     # 3. Timesheet V2 (Start/End Times)
     conn.execute('''CREATE TABLE IF NOT EXISTS timesheet_entry_v2 (
@@ -45,15 +67,19 @@ def setup_database():
         leave_type TEXT, ojti_hours REAL DEFAULT 0, cic_hours REAL DEFAULT 0,
         UNIQUE(period_ending, day_date)
     )''')
+
+    # 4. Lookup indexes (also created by ingest.py; repeated here for databases ingested before they existed)
+    # timesheet_entry_v2 needs none: its UNIQUE(period_ending, day_date) index already serves period lookups.
+    tables = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    for table, ddl in LINE_ITEM_INDEXES:
+        if table in tables:
+            conn.execute(ddl)
     conn.commit()
-    conn.close()
 
 # --- NEW: Helper to get schedule for a specific year ---
 def get_user_schedule(year=None):
     if year is None: year = datetime.now().year
-    conn = get_db()
-    df = pd.read_sql("SELECT * FROM user_schedule WHERE year = ?", conn, params=(year,))
-    conn.close()
+    df = _frame(get_db().cursor(), "SELECT * FROM user_schedule WHERE year = ?", (year,))
     
     # If no schedule exists for this year, return a blank template
     if df.empty:
@@ -66,63 +92,49 @@ def get_user_schedule(year=None):
         return pd.DataFrame(data)
     return df
 
+def _clean_cell(value):
+    """Normalizes a data-editor cell (list from Streamlit / NaN / empty string) to a value or None."""
+    if isinstance(value, list):
+        value = value[0] if value else None
+    if pd.isna(value) or value == "":
+        return None
+    return value
+
 def save_user_schedule(df, year):
-    """Saves schedule for a specific year. Deletes old entries for that year first."""
-    conn = get_db()
-    c = conn.cursor()
-    
-    # Clear existing entries for THIS year to avoid primary key conflicts on update
-    c.execute("DELETE FROM user_schedule WHERE year = ?", (year,))
-    
-    for _, row in df.iterrows():
-        s = row['start_time']
-        e = row['end_time']
-        
-        # --- FIX: Handle Lists returned by Streamlit Editor ---
-        if isinstance(s, list): 
-            s = s[0] if len(s) > 0 else None
-        if isinstance(e, list): 
-            e = e[0] if len(e) > 0 else None
-        # ----------------------------------------------------
+    """Saves schedule for a specific year (upsert per weekday; weekdays missing from df are removed)."""
+    rows = []
+    for row in df.itertuples(index=False):
+        s, e = _clean_cell(row.start_time), _clean_cell(row.end_time)
+        rows.append((year, row.day_of_week, s, e, 1 if s is not None else 0))
+    days = [r[1] for r in rows]
 
-        # Clean inputs
-        if s == "" or pd.isna(s): s = None
-        if e == "" or pd.isna(e): e = None
-        
-        is_workday = 1 if s is not None else 0
-        
-        # Insert new row
-        c.execute("INSERT INTO user_schedule (year, day_of_week, start_time, end_time, is_workday) VALUES (?, ?, ?, ?, ?)", 
-                  (year, row['day_of_week'], s, e, is_workday))
-                  
-    conn.commit()
-    conn.close()
+    conn = get_db()
+    # Commit or roll back as one unit so a failure can't leave the shared connection mid-transaction
+    with conn:
+        conn.executemany("""
+            INSERT INTO user_schedule (year, day_of_week, start_time, end_time, is_workday) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(year, day_of_week) DO UPDATE SET
+            start_time=excluded.start_time, end_time=excluded.end_time, is_workday=excluded.is_workday
+        """, rows)
+        conn.execute(f"DELETE FROM user_schedule WHERE year = ? AND day_of_week NOT IN ({','.join('?' * len(days))})",
+                     (year, *days))
     
 def get_paystubs_meta():
     conn = get_db()
     df = pd.read_sql("SELECT id, pay_date, period_ending, net_pay, gross_pay, file_source FROM paystubs ORDER BY pay_date DESC", conn)
-    conn.close()
     return df
 
 def get_full_paystub_data(stub_id):
     conn = get_db()
-    stub = dict(conn.execute("SELECT * FROM paystubs WHERE id = ?", (stub_id,)).fetchone())
-    earnings = pd.read_sql("SELECT * FROM earnings WHERE paystub_id = ?", conn, params=(stub_id,))
-    deductions = pd.read_sql("SELECT * FROM deductions WHERE paystub_id = ?", conn, params=(stub_id,))
-    leave = pd.read_sql("SELECT * FROM leave_balances WHERE paystub_id = ?", conn, params=(stub_id,))
-    conn.close()
+    c = conn.cursor()
+    stub = dict(c.execute("SELECT * FROM paystubs WHERE id = ?", (stub_id,)).fetchone())
+    earnings = _frame(c, "SELECT * FROM earnings WHERE paystub_id = ?", (stub_id,))
+    deductions = _frame(c, "SELECT * FROM deductions WHERE paystub_id = ?", (stub_id,))
+    leave = _frame(c, "SELECT * FROM leave_balances WHERE paystub_id = ?", (stub_id,))
     return {'stub': stub, 'earnings': earnings, 'deductions': deductions, 'leave': leave}
 
-def get_pay_period_dates(period_ending_str):
-    end_date = datetime.strptime(period_ending_str, "%Y-%m-%d")
-    dates = []
-    start_date = end_date - timedelta(days=13)
-    for i in range(14):
-        d = start_date + timedelta(days=i)
-        dates.append(d.strftime("%Y-%m-%d"))
-    return dates
-
 def load_timesheet_v2(period_ending):
+    """Returns (has_saved, df): whether the period has a saved timesheet, and the 14-day editor frame."""
     conn = get_db()
     
     # 1. Determine Year from period_ending
@@ -130,103 +142,100 @@ def load_timesheet_v2(period_ending):
     target_year = pe_date.year
     
     # 2. Fetch specific schedule for that year
-    defaults = pd.read_sql("SELECT * FROM user_schedule WHERE year = ?", conn, params=(target_year,)).set_index('day_of_week')
-    
-    saved = pd.read_sql("SELECT * FROM timesheet_entry_v2 WHERE period_ending = ?", conn, params=(period_ending,))
-    conn.close()
+    c = conn.cursor()
+    defaults = _frame(c, "SELECT * FROM user_schedule WHERE year = ?", (target_year,)).set_index('day_of_week')
     
-    dates = get_pay_period_dates(period_ending)
-    data = []
+    saved = _frame(c, "SELECT * FROM timesheet_entry_v2 WHERE period_ending = ?", (period_ending,))
     
-    for d in dates:
-        dt = datetime.strptime(d, "%Y-%m-%d")
-        day_idx = dt.weekday()
-        
-        row = saved[saved['day_date'] == d] if not saved.empty else pd.DataFrame()
-        
-        if not row.empty:
-            # RETURN STRINGS directly from DB
-            r = row.iloc[0]
-            data.append({
-                "Date": d,
-                "Start": r['start_time'], 
-                "End": r['end_time'],     
-                "Leave_Type": r['leave_type'],
-                "OJTI": r['ojti_hours'],
-                "CIC": r['cic_hours']
-            })
-        else:
-            # Check if we have a default schedule for this year
-            def_row = defaults.loc[day_idx] if day_idx in defaults.index else None
-            
-            if def_row is not None and def_row['is_workday']:
-                data.append({
-                    "Date": d, 
-                    "Start": def_row['start_time'], 
-                    "End": def_row['end_time'], 
-                    "Leave_Type": None,
-                    "OJTI": 0.0, 
-                    "CIC": 0.0
-                })
-            else:
-                data.append({
-                    "Date": d, "Start": None, "End": None, 
-                    "Leave_Type": None, "OJTI": 0.0, "CIC": 0.0
-                })
-                
-    return pd.DataFrame(data)
+    return not saved.empty, _build_timesheet_v2(period_ending, saved, defaults)
+
+def load_timesheets_v2_bulk(periods):
+    """Loads timesheets for many periods with one query per table. Returns {period_ending: DataFrame}."""
+    periods = list(periods)
+    if not periods:
+        return {}
+
+    years = sorted({datetime.strptime(pe, "%Y-%m-%d").year for pe in periods})
+    conn = get_db()
+    sched = pd.read_sql(f"SELECT * FROM user_schedule WHERE year IN ({','.join('?' * len(years))})", conn, params=years)
+    saved = pd.read_sql(f"SELECT * FROM timesheet_entry_v2 WHERE period_ending IN ({','.join('?' * len(periods))})", conn, params=periods)
+
+    saved_by_period = dict(tuple(saved.groupby('period_ending')))
+    defaults_by_year = {y: sched[sched['year'] == y].set_index('day_of_week') for y in years}
+
+    result = {}
+    for pe in periods:
+        defaults = defaults_by_year[datetime.strptime(pe, "%Y-%m-%d").year]
+        result[pe] = _build_timesheet_v2(pe, saved_by_period.get(pe, saved.iloc[0:0]), defaults)
+    return result
+
+def _build_timesheet_v2(period_ending, saved, defaults):
+    """Merges saved rows for one period with that year's default schedule into the 14-day editor frame."""
+    days = pd.date_range(end=period_ending, periods=14)
+    frame = pd.DataFrame({'Date': days.strftime("%Y-%m-%d"), 'day_of_week': days.weekday})
+    frame = frame.merge(saved[['day_date', 'start_time', 'end_time', 'leave_type', 'ojti_hours', 'cic_hours']],
+                        left_on='Date', right_on='day_date', how='left')
+    is_saved = frame['day_date'].notna()
+
+    # Unsaved days fall back to the year's schedule (times only on workdays)
+    workday = defaults['is_workday'].astype(bool)
+    def_start = frame['day_of_week'].map(defaults['start_time'][workday])
+    def_end = frame['day_of_week'].map(defaults['end_time'][workday])
+
+    def as_obj(col):
+        # Editor expects None (not NaN) in the text columns
+        return col.astype(object).where(col.notna(), None)
+
+    # RETURN STRINGS directly from DB
+    return pd.DataFrame({
+        "Date": frame['Date'],
+        "Start": as_obj(frame['start_time'].where(is_saved, def_start)),
+        "End": as_obj(frame['end_time'].where(is_saved, def_end)),
+        "Leave_Type": as_obj(frame['leave_type']),
+        "OJTI": frame['ojti_hours'].where(is_saved, 0.0).astype(float),
+        "CIC": frame['cic_hours'].where(is_saved, 0.0).astype(float),
+    })
 
 def save_timesheet_v2(period_ending, df):
+    # Empty strings -> None for DB
+    rows = [(period_ending, r.Date, r.Start or None, r.End or None, _clean_cell(r.Leave_Type), r.OJTI, r.CIC)
+            for r in df.itertuples(index=False)]
+
     conn = get_db()
-    c = conn.cursor()
-    for _, row in df.iterrows():
-        s_str = row['Start']
-        e_str = row['End']
-        
-        # Clean up empty strings -> None for DB
-        if not s_str: s_str = None
-        if not e_str: e_str = None
-        
-        # Clean Leave_Type
-        l_type = row['Leave_Type']
-        if isinstance(l_type, list): 
-            l_type = l_type[0] if l_type else None
-        if pd.isna(l_type) or l_type == "": 
-            l_type = None
-        
-        c.execute("""
+    with conn:
+        conn.executemany("""
             INSERT INTO timesheet_entry_v2 (period_ending, day_date, start_time, end_time, leave_type, ojti_hours, cic_hours)
             VALUES (?, ?, ?, ?, ?, ?, ?)
             ON CONFLICT(period_ending, day_date) DO UPDATE SET
             start_time=excluded.start_time, end_time=excluded.end_time,
             leave_type=excluded.leave_type, ojti_hours=excluded.ojti_hours, cic_hours=excluded.cic_hours
-        """, (period_ending, row['Date'], s_str, e_str, l_type, row['OJTI'], row['CIC']))
-    conn.commit()
-    conn.close()
+        """, rows)
+
+# Pay-rate source: this stub's first Regular row if its rate is > 0, else the most recent Regular row with a rate
+_SQL_REF_RATE = """
+    SELECT id, paystub_id FROM (
+        SELECT id, paystub_id, 0 AS pick FROM
+            (SELECT id, paystub_id, rate FROM earnings WHERE paystub_id = ? AND type LIKE '%Regular%' ORDER BY id LIMIT 1)
+        WHERE rate > 0
+        UNION ALL
+        SELECT id, paystub_id, 1 FROM
+            (SELECT id, paystub_id FROM earnings WHERE type LIKE '%Regular%' AND rate > 0 ORDER BY id DESC LIMIT 1)
+    ) ORDER BY pick LIMIT 1
+"""
 
 def get_reference_data(current_stub_id):
     """Finds best available rates/deductions (History Fallback Logic for Shutdowns)."""
     conn = get_db()
-    curr_earnings = pd.read_sql("SELECT * FROM earnings WHERE paystub_id = ?", conn, params=(current_stub_id,))
-    reg_rows = curr_earnings[curr_earnings['type'].str.contains('Regular', case=False, na=False)]
-    
-    if not reg_rows.empty and reg_rows.iloc[0]['rate'] > 0:
-        base_rate = reg_rows.iloc[0]['rate']
-        deductions = pd.read_sql("SELECT * FROM deductions WHERE paystub_id = ?", conn, params=(current_stub_id,))
-        conn.close()
-        return base_rate, deductions, curr_earnings
-    
-    last_good = pd.read_sql("SELECT paystub_id, rate FROM earnings WHERE type LIKE '%Regular%' AND rate > 0 ORDER BY id DESC LIMIT 1", conn)
-    if not last_good.empty:
-        ref_id = int(last_good.iloc[0]['paystub_id'])
-        ref_rate = last_good.iloc[0]['rate']
-        ref_ded = pd.read_sql("SELECT * FROM deductions WHERE paystub_id = ?", conn, params=(ref_id,))
-        ref_earn = pd.read_sql("SELECT * FROM earnings WHERE paystub_id = ?", conn, params=(ref_id,))
-        conn.close()
-        return ref_rate, ref_ded, ref_earn
+    c = conn.cursor()
+    chosen = c.execute(_SQL_REF_RATE, (current_stub_id,)).fetchone()
+    if chosen is None:
+        return 0.0, pd.DataFrame(), pd.DataFrame()
 
-    conn.close()
-    return 0.0, pd.DataFrame(), pd.DataFrame()
+    row_id, ref_id = chosen
+    ref_ded = _frame(c, "SELECT * FROM deductions WHERE paystub_id = ?", (ref_id,))
+    ref_earn = _frame(c, "SELECT * FROM earnings WHERE paystub_id = ?", (ref_id,))
+    ref_rate = ref_earn.loc[ref_earn['id'] == row_id, 'rate'].iloc[0]
+    return ref_rate, ref_ded, ref_earn
 
 def has_saved_timesheet(period_ending):
     """Returns True if the user has explicitly saved a timesheet for this period."""
@@ -234,9 +243,14 @@ def has_saved_timesheet(period_ending):
     c = conn.cursor()
     c.execute("SELECT count(*) FROM timesheet_entry_v2 WHERE period_ending = ?", (period_ending,))
     count = c.fetchone()[0]
-    conn.close()
     return count > 0
 
+def get_audited_periods():
+    """Returns the set of period_ending dates that have a saved timesheet."""
+    conn = get_db()
+    rows = conn.execute("SELECT DISTINCT period_ending FROM timesheet_entry_v2").fetchall()
+    return {r[0] for r in rows}
+
 def get_all_line_items():
     """Fetches all earnings and deductions history normalized by pay_date."""
     conn = get_db()
@@ -259,5 +273,4 @@ def get_all_line_items():
     """
     df_ded = pd.read_sql(sql_ded, conn)
     
-    conn.close()
     return df_earn, df_ded
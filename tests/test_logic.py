@@ -0,0 +1,77 @@
+import os
+import sys
+import unittest
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import logic
+
+META = {'pay_date': '2026-01-09', 'period_ending': '2026-01-03', 'net_pay': 0.0, 'gross_pay': 0.0, 'total_deductions': 0.0}
+
+
+def expected_pay(base_rate, regular, overtime, ref_earnings):
+    buckets = pd.DataFrame([{'Regular': regular, 'Overtime': overtime}])
+    return logic.calculate_expected_pay(buckets, base_rate, dict(META), pd.DataFrame(), pd.DataFrame(), ref_earnings)
+
+
+class ExpectedPayRoundingTest(unittest.TestCase):
+    """Half-cent cases, checked against the values the original calculate_expected_pay produced."""
+
+    def ref_earnings(self, cip):
+        return pd.DataFrame({
+            'type': ['Regular', 'Controller Incentive Pay'],
+            'amount_current': [4580.80, cip],
+            'amount_ytd': [40000.0, 1200.0],
+        })
+
+    def test_flsa_with_cip_python_float_rate(self):
+        # 57.26 x 3.25 OT with a 3% CIP: FLSA premium lands on a half cent
+        res = expected_pay(57.26, 80.0, 3.25, self.ref_earnings(137.42))
+        self.assertEqual(res['earnings']['amount_current'].tolist(), [4580.8, 137.42, 95.74, 186.09])
+        self.assertEqual(round(res['stub']['gross_pay'], 2), 5000.05)
+
+    def test_flsa_with_cip_other_direction(self):
+        res = expected_pay(57.26, 80.0, 4.25, self.ref_earnings(200.18))
+        self.assertEqual(res['earnings']['amount_current'].tolist(), [4580.8, 200.18, 126.74, 243.35])
+        self.assertEqual(round(res['stub']['gross_pay'], 2), 5151.07)
+
+    def test_flsa_with_cip_numpy_rate(self):
+        # Rate as it comes out of get_reference_data (np.float64): True Overtime rounds up here
+        res = expected_pay(np.float64(57.26), 80.0, 3.25, self.ref_earnings(137.42))
+        self.assertEqual(res['earnings']['amount_current'].tolist(), [4580.8, 137.42, 95.74, 186.1])
+        self.assertEqual(round(res['stub']['gross_pay'], 2), 5000.06)
+
+
+class BucketTruncationTest(unittest.TestCase):
+    """Bucket sums in odd minutes are inexact floats; the 4-decimal floor must cut them like the original code."""
+
+    def buckets(self):
+        return pd.DataFrame([
+            {'Regular': 7 + m / 60, 'Overtime': m / 60 * 3, 'Night': (m + 1) / 60, 'Sunday': (m + 2) / 60,
+             'OJTI': (m + 3) / 60, 'CIC': (m + 5) / 60}
+            for m in (7, 13, 29, 41, 53)
+        ])
+
+    def run_pay(self, base_rate):
+        ref = pd.DataFrame({'type': ['Regular'], 'amount_current': [4580.80], 'amount_ytd': [40000.0]})
+        return logic.calculate_expected_pay(self.buckets(), base_rate, dict(META), pd.DataFrame(), pd.DataFrame(), ref)
+
+    def test_amounts_match_original(self):
+        res = self.run_pay(57.26)
+        self.assertEqual(res['earnings'][['type', 'amount_current']].values.tolist(), [
+            ['Regular', 2140.57], ['FLSA Premium', 213.07], ['True Overtime', 409.41], ['Night Differential', 14.13],
+            ['Sunday Premium', 36.49], ['OJTI', 37.68], ['CIC', 16.04]])
+        self.assertEqual(round(res['stub']['gross_pay'], 2), 2867.39)
+
+    def test_amounts_match_original_numpy_rate(self):
+        res = self.run_pay(np.float64(55.37))
+        self.assertEqual(res['earnings'][['type', 'amount_current']].values.tolist(), [
+            ['Regular', 2069.91], ['FLSA Premium', 206.06], ['True Overtime', 395.9], ['Night Differential', 13.66],
+            ['Sunday Premium', 35.29], ['OJTI', 36.44], ['CIC', 15.51]])
+        self.assertEqual(round(res['stub']['gross_pay'], 2), 2772.77)
+
+
+if __name__ == '__main__':
+    unittest.main()
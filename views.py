@@ -1,125 +1,139 @@
-import pandas as pd
 import os
+from functools import lru_cache
+from pandas.api.types import is_numeric_dtype
 
+# --- Line-item row templates ---
+_EARN_TR = ('<tr><td>{type}</td><td class="text-align-right">{rate}</td><td class="text-align-right">{hours}</td>'
+            '<td class="text-align-right">{current}</td><td class="text-align-right">{ytd}</td></tr>')
+_DED_TR = '<tr><td>{type}</td><td class="text-align-right">{current}</td><td class="text-align-right">{ytd}</td></tr>'
+_LEAVE_TR = ('<tr><td>{type}</td><td class="text-align-right">{start}</td><td class="text-align-right">{earned}</td>'
+             '<td class="text-align-right">{used}</td><td class="text-align-right">{end}</td></tr>')
+
+def _missing(v):
+    """True for an empty cell (None or NaN); cells here are only ever None, floats, ints or strings."""
+    return v is None or (isinstance(v, float) and v != v)
+
+def _money_col(col):
+    """Formats a whole column like val(): NaN -> 0.00, numbers -> 1,234.56, anything else as-is."""
+    if is_numeric_dtype(col):
+        # Numeric column: NaN is the only missing value and every cell is a number, so v != v is the whole check
+        return ["0.00" if v != v else f"{v:,.2f}" for v in col.tolist()]
+    return ["0.00" if _missing(v) else f"{v:,.2f}" if isinstance(v, (int, float)) else str(v) for v in col.tolist()]
+
+def _plain_col(col):
+    """Same as _money_col but without money formatting (rates, hours, leave balances)."""
+    if is_numeric_dtype(col):
+        return ["0.00" if v != v else str(v) for v in col.tolist()]
+    return ["0.00" if _missing(v) else str(v) for v in col.tolist()]
+
+def _leave_rows(lv, flags):
+    """Yields the leave table rows; a flagged end balance gets the audit-error span (only when present)."""
+    for t, start, earned, used, end, has_end in zip(lv['type'].tolist(), _plain_col(lv['balance_start']), _plain_col(lv['earned_current']),
+                                                    _plain_col(lv['used_current']), _plain_col(lv['balance_end']), lv['balance_end'].notna().tolist()):
+        fid = f"leave_{t}_end"
+        if has_end and fid in flags:
+            end = f'<span class="audit-error" title="{flags[fid]}">{end}</span>'
+        yield _LEAVE_TR.format(type=t, start=start, earned=earned, used=used, end=end)
+
+@lru_cache(maxsize=1)
 def get_css():
-    """Reads the external style.css file."""
+    """Reads the external style.css file (once per process)."""
     css_file = 'style.css'
     if os.path.exists(css_file):
         with open(css_file) as f:
             return f'<style>{f.read()}</style>'
     return "<style></style>"
 
+# --- Paystub page templates (no indentation: Markdown would read it as a code block) ---
+_STUB_HTML = (
+    '<div class="stub-wrapper"><div id="elsInfoTable">'
+    '<table class="table els-table" cellpadding="0" cellspacing="0"><tbody>'
+    # Header
+    '<tr><td colspan="6" rowspan="2" class="col-6">'
+    '<span class="text-align-center cell-title-lg2">{agency}</span><br>'
+    '<span class="text-align-center cell-title-lg2">Earnings and Leave Statement</span></td>'
+    '<td colspan="3" class="col-3"><span class="cell-title">For Pay Period Ending</span><span>{period_ending}</span></td>'
+    '<td colspan="3" class="col-3 no-margin-padding"><span class="cell-title blue">Net Pay</span><span class="cell">$ {net_pay_flagged}</span></td></tr>'
+    '<tr><td colspan="3"><span class="cell-title">Pay Date</span><span>{pay_date}</span></td><td colspan="3"></td></tr>'
+    # Summary
+    '<tr><td colspan="5" class="no-margin-padding"><table class="table no-margin-padding no-border">'
+    '<tr><th class="col-6 blue no-border">Your Pay Consists of</th><th class="col-3 blue no-border text-align-right">Current</th></tr>'
+    '<tr><td>Gross Pay</td><td class="text-align-right">{gross_pay}</td></tr>'
+    '<tr><td>Total Deductions</td><td class="text-align-right">{total_deductions}</td></tr>'
+    '<tr><td>Net Pay</td><td class="text-align-right">{net_pay}</td></tr>'
+    '</table></td><td colspan="7"></td></tr>'
+    # Earnings (always shown, even when empty)
+    '<tr><td colspan="12" class="blue"><span class="text-align-center cell-title-lg">Earnings</span></td></tr>'
+    '<tr><td colspan="12"><table class="table no-border no-margin-padding">'
+    '<tr><th class="col-5">Type</th><th class="col-1 text-align-right">Rate</th><th class="col-1 text-align-right">Hours</th>'
+    '<th class="col-1 text-align-right">Current</th><th class="col-1 text-align-right">YTD</th></tr>'
+    '{earnings_rows}</table></td></tr>'
+    '{deductions}{leave}{remarks}'
+    '</tbody></table></div></div>'
+)
+_DED_SECTION = (
+    '<tr><td colspan="12" class="blue"><span class="text-align-center cell-title-lg">Deductions</span></td></tr>'
+    '<tr><td colspan="12"><table class="table no-border no-margin-padding">'
+    '<tr><th class="col-4">Type</th><th class="col-2 text-align-right">Current</th><th class="col-2 text-align-right">YTD</th></tr>'
+    '{rows}</table></td></tr>'
+)
+_LEAVE_SECTION = (
+    '<tr><td colspan="12" class="blue"><span class="text-align-center cell-title-lg">Leave</span></td></tr>'
+    '<tr><td colspan="12"><table class="table no-border no-margin-padding">'
+    '<tr><th class="col-2">Type</th><th class="col-1 text-align-right">Start Bal</th><th class="col-1 text-align-right">Earned</th>'
+    '<th class="col-1 text-align-right">Used</th><th class="col-1 text-align-right">End Bal</th></tr>'
+    '{rows}</table></td></tr>'
+)
+_REMARKS_SECTION = (
+    '<tr><td colspan="12" class="blue"><span class="text-align-center cell-title-lg">Remarks</span></td></tr>'
+    '<tr><td colspan="12" style="padding:10px"><span style="font-family:monospace">{remarks}</span></td></tr>'
+)
+
 def render_paystub_html(data, flags=None, mode="actual"):
     if flags is None: flags = {}
     stub = data['stub']
 
     def val(v, fid=None, money=True):
-        if pd.isna(v): return "0.00"
+        if _missing(v): return "0.00"
         txt = f"{v:,.2f}" if money and isinstance(v, (int,float)) else str(v)
         if fid and fid in flags: return f'<span class="audit-error" title="{flags[fid]}">{txt}</span>'
         return txt
 
-    # We build a list of strings
-    parts = []
-    
-    parts.append('<div class="stub-wrapper"><div id="elsInfoTable">')
-    parts.append('<table class="table els-table" cellpadding="0" cellspacing="0"><tbody>')
-    
-    # --- HEADER SECTION ---
-    parts.append(f'''
-    <tr>
-        <td colspan="6" rowspan="2" class="col-6">
-            <span class="text-align-center cell-title-lg2">{stub['agency']}</span><br>
-            <span class="text-align-center cell-title-lg2">Earnings and Leave Statement</span>
-        </td>
-        <td colspan="3" class="col-3">
-            <span class="cell-title">For Pay Period Ending</span><span>{stub['period_ending']}</span>
-        </td>
-        <td colspan="3" class="col-3 no-margin-padding">
-            <span class="cell-title blue">Net Pay</span><span class="cell">$ {val(stub['net_pay'], 'net_pay')}</span>
-        </td>
-    </tr>
-    <tr>
-        <td colspan="3"><span class="cell-title">Pay Date</span><span>{stub['pay_date']}</span></td>
-        <td colspan="3"></td>
-    </tr>
-    ''')
-
-    # --- SUMMARY TABLE ---
-    parts.append(f'''
-    <tr>
-        <td colspan="5" class="no-margin-padding">
-            <table class="table no-margin-padding no-border">
-                <tr><th class="col-6 blue no-border">Your Pay Consists of</th><th class="col-3 blue no-border text-align-right">Current</th></tr>
-                <tr><td>Gross Pay</td><td class="text-align-right">{val(stub['gross_pay'], 'gross_pay')}</td></tr>
-                <tr><td>Total Deductions</td><td class="text-align-right">{val(stub['total_deductions'])}</td></tr>
-                <tr><td>Net Pay</td><td class="text-align-right">{val(stub['net_pay'])}</td></tr>
-            </table>
-        </td>
-        <td colspan="7"></td>
-    </tr>
-    ''')
-
     # --- EARNINGS ---
-    parts.append('<tr><td colspan="12" class="blue"><span class="text-align-center cell-title-lg">Earnings</span></td></tr>')
-    parts.append('<tr><td colspan="12"><table class="table no-border no-margin-padding">')
-    parts.append('<tr><th class="col-5">Type</th><th class="col-1 text-align-right">Rate</th><th class="col-1 text-align-right">Hours</th><th class="col-1 text-align-right">Current</th><th class="col-1 text-align-right">YTD</th></tr>')
-    
-    if not data['earnings'].empty:
-        for _, r in data['earnings'].iterrows():
-            parts.append(f'''
-            <tr>
-                <td>{r['type']}</td>
-                <td class="text-align-right">{val(r['rate'], money=False)}</td>
-                <td class="text-align-right">{val(r['hours_current'], money=False)}</td>
-                <td class="text-align-right">{val(r['amount_current'])}</td>
-                <td class="text-align-right">{val(r['amount_ytd'])}</td>
-            </tr>
-            ''')
-    parts.append('</table></td></tr>')
+    earnings_rows = ""
+    earn = data['earnings']
+    if not earn.empty:
+        earnings_rows = "".join(
+            _EARN_TR.format(type=t, rate=rate, hours=hrs, current=cur, ytd=ytd)
+            for t, rate, hrs, cur, ytd in zip(earn['type'].tolist(), _plain_col(earn['rate']), _plain_col(earn['hours_current']),
+                                              _money_col(earn['amount_current']), _money_col(earn['amount_ytd']))
+        )
 
     # --- DEDUCTIONS ---
-    if not data['deductions'].empty:
-        parts.append('<tr><td colspan="12" class="blue"><span class="text-align-center cell-title-lg">Deductions</span></td></tr>')
-        parts.append('<tr><td colspan="12"><table class="table no-border no-margin-padding">')
-        parts.append('<tr><th class="col-4">Type</th><th class="col-2 text-align-right">Current</th><th class="col-2 text-align-right">YTD</th></tr>')
-        
-        for _, r in data['deductions'].iterrows():
-             parts.append(f'''
-             <tr>
-                <td>{r['type']}</td>
-                <td class="text-align-right">{val(r['amount_current'])}</td>
-                <td class="text-align-right">{val(r['amount_ytd'])}</td>
-             </tr>
-             ''')
-        parts.append('</table></td></tr>')
+    deductions = ""
+    ded = data['deductions']
+    if not ded.empty:
+        deductions = _DED_SECTION.format(rows="".join(
+            _DED_TR.format(type=t, current=cur, ytd=ytd)
+            for t, cur, ytd in zip(ded['type'].tolist(), _money_col(ded['amount_current']), _money_col(ded['amount_ytd']))
+        ))
 
     # --- LEAVE ---
-    if not data['leave'].empty:
-        parts.append('<tr><td colspan="12" class="blue"><span class="text-align-center cell-title-lg">Leave</span></td></tr>')
-        parts.append('<tr><td colspan="12"><table class="table no-border no-margin-padding">')
-        parts.append('<tr><th class="col-2">Type</th><th class="col-1 text-align-right">Start Bal</th><th class="col-1 text-align-right">Earned</th><th class="col-1 text-align-right">Used</th><th class="col-1 text-align-right">End Bal</th></tr>')
-        
-        for _, r in data['leave'].iterrows():
-            fid = f"leave_{r['type']}_end"
-            parts.append(f'''
-            <tr>
-                <td>{r['type']}</td>
-                <td class="text-align-right">{val(r['balance_start'], money=False)}</td>
-                <td class="text-align-right">{val(r['earned_current'], money=False)}</td>
-                <td class="text-align-right">{val(r['used_current'], money=False)}</td>
-                <td class="text-align-right">{val(r['balance_end'], fid, money=False)}</td>
-            </tr>
-            ''')
-        parts.append('</table></td></tr>')
+    leave = ""
+    lv = data['leave']
+    if not lv.empty:
+        leave = _LEAVE_SECTION.format(rows="".join(_leave_rows(lv, flags)))
 
     # --- REMARKS ---
+    remarks = ""
     if stub.get('remarks'):
-        rem = stub['remarks'].replace('\n', '<br>')
-        parts.append(f'<tr><td colspan="12" class="blue"><span class="text-align-center cell-title-lg">Remarks</span></td></tr><tr><td colspan="12" style="padding:10px"><span style="font-family:monospace">{rem}</span></td></tr>')
+        remarks = _REMARKS_SECTION.format(remarks=stub['remarks'].replace('\n', '<br>'))
 
-    parts.append('</tbody></table></div></div>')
-    
-    # JOIN AND STRIP WHITESPACE TO PREVENT MARKDOWN CODE BLOCKS
-    final_html = "".join(parts)
+    final_html = _STUB_HTML.format(
+        agency=stub['agency'], period_ending=stub['period_ending'], pay_date=stub['pay_date'],
+        net_pay_flagged=val(stub['net_pay'], 'net_pay'), gross_pay=val(stub['gross_pay'], 'gross_pay'),
+        total_deductions=val(stub['total_deductions']), net_pay=val(stub['net_pay']),
+        earnings_rows=earnings_rows, deductions=deductions, leave=leave, remarks=remarks,
+    )
+    # STRIP WHITESPACE the data itself may carry, TO PREVENT MARKDOWN CODE BLOCKS
     return final_html.replace('\n', '').replace('    ', '')